@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from kombu import Exchange, Queue
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
@@ -8,4 +9,74 @@ app = Celery("config")
 
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
+# Очереди задач и параметры подтверждения:
+# notifications - отправка пачек писем и отложенный запуск рассылки, задачи
+# только ждут SMTP и кеш и не обращаются к базе данных; повторная доставка после
+# падения воркера дала бы дубли писем, поэтому задача подтверждается при получении;
+# course_updates - чтение подписчиков курса из базы и разбиение рассылки на пачки,
+# подтверждается при получении по той же причине;
+# payments - работа со Stripe, задача подтверждается после выполнения,
+# чтобы платеж не потерялся при падении воркера;
+# maintenance - периодическое обслуживание, задачи идемпотентны и
+# подтверждаются после выполнения
+TASK_QUEUES = {
+    "notifications": {
+        "tasks": (
+            "users.tasks.flush_course_update",
+            "users.tasks.send_course_update_batch",
+        ),
+        "acks_late": False,
+    },
+    "course_updates": {
+        "tasks": ("users.tasks.send_course_update",),
+        "acks_late": False,
+    },
+    "payments": {
+        "tasks": (
+            "users.tasks.create_checkout_session",
+            "users.tasks.process_stripe_events",
+        ),
+        "acks_late": True,
+    },
+    "maintenance": {
+        "tasks": (
+            "users.tasks.blocking_users",
+            "users.tasks.flush_last_logins",
+            "users.tasks.test_add",
+        ),
+        "acks_late": True,
+    },
+}
+
+# Параметры воркеров очередей - единственный источник для docker-compose.yaml
+# (команда celery_worker) и bench_celery_queues. Рассылки ждут сеть и обслуживаются
+# eventlet с большим числом зеленых потоков и предвыборкой; задачи этой очереди
+# не должны обращаться к базе данных: psycopg блокирует весь процесс eventlet,
+# а каждый зеленый поток держал бы свое соединение (CONN_MAX_AGE).
+# Задачи с запросами к базе выполняются процессами prefork по одной задаче за раз,
+# число соединений с базой не превышает concurrency воркера
+QUEUE_WORKERS = {
+    "notifications": {"pool": "eventlet", "concurrency": 100, "prefetch_multiplier": 4},
+    "course_updates": {"pool": "prefork", "concurrency": 2, "prefetch_multiplier": 1},
+    "payments": {"pool": "prefork", "concurrency": 4, "prefetch_multiplier": 1},
+    "maintenance": {"pool": "prefork", "concurrency": 1, "prefetch_multiplier": 1},
+}
+
+app.conf.task_queues = [
+    Queue(name, Exchange(name), routing_key=name) for name in TASK_QUEUES
+]
+app.conf.task_default_queue = "maintenance"
+app.conf.task_routes = {
+    task: {"queue": name}
+    for name, queue in TASK_QUEUES.items()
+    for task in queue["tasks"]
+}
+app.conf.task_annotations = {
+    task: {"acks_late": queue["acks_late"]}
+    for queue in TASK_QUEUES.values()
+    for task in queue["tasks"]
+}
+# Задача с поздним подтверждением возвращается в очередь, если воркер упал
+app.conf.task_reject_on_worker_lost = True
+
 app.autodiscover_tasks()
@@ -0,0 +1,56 @@
+"""
+Gunicorn config for config project.
+
+Запуск: gunicorn -c config/gunicorn.py
+Параметры задаются переменными окружения GUNICORN_*. По умолчанию используется
+WSGI-приложение с потоковыми воркерами gthread; GUNICORN_WORKER_CLASS=uvicorn
+переключает на ASGI-приложение config.asgi с воркерами uvicorn
+(требует установленного пакета uvicorn).
+"""
+
+import multiprocessing
+import os
+
+UVICORN_WORKER = "uvicorn.workers.UvicornWorker"
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class == "uvicorn":
+    worker_class = UVICORN_WORKER
+wsgi_app = (
+    "config.asgi:application"
+    if worker_class == UVICORN_WORKER
+    else "config.wsgi:application"
+)
+
+# Процессы: 2 * CPU + 1 для синхронных запросов к базе данных,
+# потоки внутри процесса перекрывают ожидание базы данных, Redis и Stripe
+workers = int(os.getenv("GUNICORN_WORKERS") or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Приложение загружается один раз в мастер-процессе до fork воркеров
+preload_app = os.getenv("GUNICORN_PRELOAD", "True") == "True"
+
+# Перезапуск воркера после max_requests запросов ограничивает рост памяти,
+# разброс не дает всем воркерам перезапуститься одновременно
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Keep-alive соединений с nginx и таймауты запросов, секунды
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    """Закрывает унаследованные от мастер-процесса соединения с базой данных,
+    чтобы при preload_app воркеры не использовали общий сокет."""
+
+    from django.db import connections
+
+    connections.close_all()
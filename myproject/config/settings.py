@@ -72,7 +72,7 @@ WSGI_APPLICATION = "config.wsgi.application"
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
@@ -82,7 +82,9 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
-    "UPDATE_LAST_LOGIN": True,
+    # время входа пишется через буфер users.last_login, а не UPDATE на каждый вход
+    "UPDATE_LAST_LOGIN": False,
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.BufferedTokenObtainPairSerializer",
 }
 
 SPECTACULAR_SETTINGS = {
@@ -112,14 +114,33 @@ if 'test' in sys.argv or 'migrate' in sys.argv:
 else:
     DATABASES = {
         "default": {
-            "ENGINE": "django.db.backends.postgresql_psycopg2",
+            "ENGINE": "django.db.backends.postgresql",
             "NAME": os.getenv("NAME"),
             "USER": os.getenv("USER"),
             "PASSWORD": os.getenv("PASSWORD"),
             "HOST": os.getenv("HOST"),
             "PORT": os.getenv("PORT", default="5432"),
+            # Постоянные соединения: соединение переиспользуется запросами потока
+            # CONN_MAX_AGE секунд и проверяется перед использованием
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True",
         }
     }
+    # Под ASGI (воркеры uvicorn) синхронный код выполняется в разных потоках,
+    # постоянные соединения этих потоков не закрываются и накапливаются
+    if os.getenv("GUNICORN_WORKER_CLASS") == "uvicorn":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+    # Пул соединений psycopg 3 вместо постоянных соединений:
+    # соединения процесса делятся между потоками, CONN_MAX_AGE должен быть 0
+    if os.getenv("DB_POOL", "False") == "True":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+                "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+            }
+        }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -161,6 +182,20 @@ CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOW_CREDENTIALS = True
 
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Количество событий Stripe, обрабатываемых за одну транзакцию
+STRIPE_EVENTS_BATCH_SIZE = int(os.getenv("STRIPE_EVENTS_BATCH_SIZE", 500))
+# Создавать сессию оплаты Stripe в фоновой задаче Celery, не блокируя запрос
+PAYMENT_CHECKOUT_ASYNC = os.getenv("PAYMENT_CHECKOUT_ASYNC", "False") == "True"
+
+# Количество платежей, читаемых из базы за один раз при потоковой выгрузке
+PAYMENTS_EXPORT_CHUNK_SIZE = int(os.getenv("PAYMENTS_EXPORT_CHUNK_SIZE", 2000))
+
+# Время хранения отчета по платежам в кеше, секунды
+PAYMENTS_REPORT_CACHE_TIMEOUT = int(os.getenv("PAYMENTS_REPORT_CACHE_TIMEOUT", 60))
+
+# Количество последних платежей и подписок в истории пользователя
+USER_HISTORY_LIMIT = int(os.getenv("USER_HISTORY_LIMIT", 10))
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
@@ -177,7 +212,17 @@ MEDIA_URL = "media/"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
-ALLOWED_LESSON_DOMAINS = ("youtube.com",)
+# Максимальное количество уроков в одном запросе массового создания или изменения
+LESSONS_BULK_MAX_SIZE = int(os.getenv("LESSONS_BULK_MAX_SIZE", 500))
+# Количество уроков в одном INSERT/UPDATE при массовом сохранении
+LESSONS_BULK_BATCH_SIZE = int(os.getenv("LESSONS_BULK_BATCH_SIZE", 100))
+
+# Домены, с которых разрешены ссылки на видео уроков (поддомены разрешены)
+ALLOWED_LESSON_DOMAINS = tuple(
+    domain
+    for domain in os.getenv("ALLOWED_LESSON_DOMAINS", "youtube.com").split(",")
+    if domain.strip()
+)
 
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = os.getenv("EMAIL_PORT")
@@ -197,17 +242,51 @@ CELERY_TIMEZONE = "Europe/Moscow"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# Количество задач, забираемых воркером заранее на один процесс (поток);
+# очереди и маршруты задач описаны в config/celery.py
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(
+    os.getenv("CELERY_WORKER_PREFETCH_MULTIPLIER", 1)
+)
 
-CELERY_BEAT_SCHEDULE = (
-    {
-        "blocking_users": {
-            "task": "users.tasks.blocking_users",
-            "schedule": timedelta(days=30),
-        },
-        "test_add": {"task": "users.tasks.test_add", "schedule": timedelta(minutes=5)},
+if 'test' in sys.argv:
+    CELERY_TASK_ALWAYS_EAGER = True
+
+# Буфер времени входа пользователей: адрес Redis (без него время входа пишется в базу сразу),
+# интервал записи буфера в базу, секунды, и количество пользователей в одном UPDATE
+LAST_LOGIN_BUFFER_URL = os.getenv("LAST_LOGIN_BUFFER_URL")
+LAST_LOGIN_FLUSH_INTERVAL = int(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", 60))
+LAST_LOGIN_FLUSH_BATCH_SIZE = int(os.getenv("LAST_LOGIN_FLUSH_BATCH_SIZE", 1000))
+
+if 'test' in sys.argv:
+    LAST_LOGIN_BUFFER_URL = None
+
+CELERY_BEAT_SCHEDULE = {
+    "blocking_users": {
+        "task": "users.tasks.blocking_users",
+        "schedule": timedelta(days=30),
     },
-)
+    "flush_last_logins": {
+        "task": "users.tasks.flush_last_logins",
+        "schedule": timedelta(seconds=LAST_LOGIN_FLUSH_INTERVAL),
+    },
+    "test_add": {"task": "users.tasks.test_add", "schedule": timedelta(minutes=5)},
+}
 
+# Размер пачки писем в одной подзадаче рассылки об обновлении курса
+COURSE_UPDATE_BATCH_SIZE = int(os.getenv("COURSE_UPDATE_BATCH_SIZE", 100))
+# Количество адресов подписчиков, читаемых из базы за один раз
+COURSE_UPDATE_CHUNK_SIZE = int(os.getenv("COURSE_UPDATE_CHUNK_SIZE", 2000))
+# Окно тишины перед рассылкой об обновлении курса, секунды:
+# правки курса и его уроков внутри окна объединяются в одну рассылку
+COURSE_UPDATE_QUIET_WINDOW = int(os.getenv("COURSE_UPDATE_QUIET_WINDOW", 900))
+
+if 'test' in sys.argv:
+    COURSE_UPDATE_QUIET_WINDOW = 0
+
+# Количество дней без входа, после которых пользователь блокируется
+INACTIVE_USER_DAYS = int(os.getenv("INACTIVE_USER_DAYS", 30))
+# Количество пользователей, блокируемых одним UPDATE
+BLOCKING_USERS_CHUNK_SIZE = int(os.getenv("BLOCKING_USERS_CHUNK_SIZE", 10000))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -220,3 +299,20 @@ CACHES = {
         'LOCATION': 'redis://redis:6379/1',
     }
 }
+
+if 'test' in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Время хранения закешированных ответов по курсам и урокам, секунды
+EDU_MATERIALS_CACHE_TIMEOUT = int(os.getenv("EDU_MATERIALS_CACHE_TIMEOUT", 300))
+
+# Время хранения ролей пользователя в кеше, секунды (0 - только в рамках запроса)
+USER_ROLES_CACHE_TIMEOUT = int(os.getenv("USER_ROLES_CACHE_TIMEOUT", 300))
+
+# Время хранения снимка пользователя для JWT-аутентификации в кеше, секунды
+# (0 - пользователь загружается из базы на каждый запрос)
+USER_AUTH_CACHE_TIMEOUT = int(os.getenv("USER_AUTH_CACHE_TIMEOUT", 300))
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EduMaterialsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "edu_materials"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,127 @@
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from users.roles import get_user_roles
+
+HITS_KEY = "edu_materials:cache:hits"
+MISSES_KEY = "edu_materials:cache:misses"
+
+
+def generation_key(name):
+    """Функция формирования ключа версии (поколения) закешированных данных."""
+
+    return f"edu_materials:gen:{name}"
+
+
+def get_generations(names):
+    """Функция возвращает текущие версии данных по их названиям.
+    Отсутствующая версия инициализируется текущим временем, чтобы после вытеснения
+    ключа из кеша не совпасть со старыми значениями."""
+
+    keys = [generation_key(name) for name in names]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generations(*names):
+    """Функция увеличивает версии данных, делая устаревшими связанные с ними ответы."""
+
+    for name in names:
+        key = generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def bump_generations_on_commit(*names):
+    """Функция увеличивает версии данных после фиксации текущей транзакции:
+    до фиксации параллельный запрос закешировал бы прежние данные под новой версией."""
+
+    transaction.on_commit(partial(bump_generations, *names))
+
+
+def response_cache_key(request, generations):
+    """Функция формирования ключа ответа: пользователь, его роли,
+    версии данных и полный путь запроса с параметрами."""
+
+    roles = ",".join(sorted(get_user_roles(request.user)))
+    raw_key = "|".join(
+        [
+            str(request.user.pk),
+            roles,
+            ",".join(str(generation) for generation in get_generations(generations)),
+            request.get_full_path(),
+        ]
+    )
+    return "edu_materials:response:" + hashlib.md5(raw_key.encode()).hexdigest()
+
+
+def record_cache_access(hit):
+    """Функция учета попаданий и промахов кеша ответов."""
+
+    key = HITS_KEY if hit else MISSES_KEY
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_cache_stats():
+    """Функция возвращает счетчики попаданий и промахов кеша ответов."""
+
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_cache_stats():
+    """Функция обнуления счетчиков кеша ответов."""
+
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+class CachedResponseMixin:
+    """Примесь для кеширования успешных ответов на GET-запросы.
+    Ключ ответа зависит от пользователя, его ролей и версий данных,
+    которые возвращает get_cache_generations()."""
+
+    def get_cache_generations(self):
+        """Метод возвращает названия версий данных, от которых зависит ответ."""
+        raise NotImplementedError
+
+    def get_cache_timeout(self):
+        """Метод возвращает время хранения ответа в кеше, секунды."""
+        return settings.EDU_MATERIALS_CACHE_TIMEOUT
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """Метод возвращает ответ из кеша или формирует и кеширует его."""
+        key = response_cache_key(request, self.get_cache_generations())
+        data = cache.get(key)
+        if data is not None:
+            record_cache_access(hit=True)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        record_cache_access(hit=False)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.get_cache_timeout())
+        response["X-Cache"] = "MISS"
+        return response
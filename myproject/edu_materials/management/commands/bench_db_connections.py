@@ -0,0 +1,113 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from edu_materials.models import Lesson
+
+MODES = ("new", "persistent", "pool")
+
+
+class Command(BaseCommand):
+    """Команда сравнения задержки дешевого запроса (выборка лекции, как в
+    LessonRetrieveAPIView) при разных режимах соединений с базой данных:
+    new - новое соединение на каждый запрос (CONN_MAX_AGE = 0),
+    persistent - постоянные соединения с проверкой (CONN_MAX_AGE, CONN_HEALTH_CHECKS),
+    pool - пул соединений psycopg (только PostgreSQL и psycopg 3).
+    Каждый поток имитирует цикл запроса Django: сигналы request_started и
+    request_finished закрывают или возвращают в пул соединение так же, как
+    при обработке HTTP-запроса. Созданная лекция удаляется после замера."""
+
+    help = "Сравнивает p50/p99 запроса лекции с разными режимами соединений с БД"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--conn-max-age", type=int, default=60)
+        parser.add_argument("--pool-max-size", type=int, default=None)
+
+    def configure(self, mode, options):
+        """Метод задает параметры соединения для режима. Соединения создаются
+        потоками заново, поэтому изменение настроек действует на следующий замер."""
+        settings_dict = connections.settings["default"]
+        settings_dict["OPTIONS"] = {
+            key: value
+            for key, value in settings_dict["OPTIONS"].items()
+            if key != "pool"
+        }
+        settings_dict["CONN_MAX_AGE"] = 0
+        settings_dict["CONN_HEALTH_CHECKS"] = False
+        if mode == "persistent":
+            settings_dict["CONN_MAX_AGE"] = options["conn_max_age"]
+            settings_dict["CONN_HEALTH_CHECKS"] = True
+        elif mode == "pool":
+            max_size = options["pool_max_size"] or options["threads"]
+            settings_dict["OPTIONS"]["pool"] = {"min_size": 2, "max_size": max_size}
+
+    def pool_supported(self):
+        """Метод проверяет, доступен ли пул соединений Django для базы данных."""
+        connection = connections["default"]
+        if connection.vendor != "postgresql":
+            return False
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        return is_psycopg3
+
+    def worker(self, lesson_id, total):
+        """Метод выполняет total имитированных запросов и возвращает их задержки."""
+        timings = []
+        try:
+            for _ in range(total):
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                try:
+                    Lesson.objects.filter(pk=lesson_id).select_related("course").get()
+                finally:
+                    request_finished.send(sender=self.__class__)
+                timings.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+        return timings
+
+    def measure(self, mode, lesson_id, options):
+        """Метод запускает потоки для режима и выводит p50/p99 и запросы в секунду."""
+        threads = options["threads"]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = executor.map(
+                self.worker, [lesson_id] * threads, [options["requests"]] * threads
+            )
+            timings = sorted(timing for result in results for timing in result)
+        elapsed = time.perf_counter() - started
+        quantiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"{mode}: p50 {quantiles[49] * 1000:.2f} мс, "
+            f"p99 {quantiles[98] * 1000:.2f} мс, "
+            f"{len(timings) / elapsed:.0f} запр/с"
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connections.settings["default"]
+        original = {
+            key: settings_dict[key]
+            for key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS", "OPTIONS")
+        }
+        lesson = Lesson.objects.create(name="bench_db_connections")
+        connections.close_all()
+        try:
+            for mode in options["modes"]:
+                if mode == "pool" and not self.pool_supported():
+                    self.stdout.write("pool: пропущен, нужен PostgreSQL и psycopg 3")
+                    continue
+                self.configure(mode, options)
+                self.measure(mode, lesson.pk, options)
+                if mode == "pool":
+                    connections.create_connection("default").close_pool()
+        finally:
+            settings_dict.update(original)
+            connections.close_all()
+            Lesson.objects.filter(pk=lesson.pk).delete()
@@ -0,0 +1,67 @@
+import re
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from edu_materials.validators import check_video_url, validate_video_urls
+
+SAMPLE_URLS = (
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "http://youtube.com/lesson_1",
+    "https://m.youtube.com/watch?v=1",
+    "https://youtube.com.example.org/lesson",
+    "https://vimeo.com/123456",
+    "not a url",
+)
+
+
+def legacy_check(url):
+    """Проверка ссылки в прежнем виде: компиляция выражения на каждый вызов
+    и поиск подстроки домена."""
+    reg = re.compile(r"^(https?:)?([\w-]{1,32}\.[\w-]{1,32})[^\s@]*$")
+    return bool(reg.match(url)) and "youtube.com" in url
+
+
+class Command(BaseCommand):
+    """Команда микробенчмарка проверки ссылок на видео уроков:
+    стоимость одного вызова прежней проверки, check_video_url
+    и пакетной проверки validate_video_urls в пересчете на одну ссылку."""
+
+    help = "Замеряет стоимость проверки одной ссылки на видео урока"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=100_000)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def report(self, title, seconds, calls):
+        """Метод выводит среднюю стоимость одного вызова в наносекундах."""
+        self.stdout.write(f"{title}: {seconds / calls * 1e9:.0f} нс/ссылка")
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        # уникальные ссылки, чтобы не замерять внутренние кеши модулей re и urllib
+        urls = [
+            f"{SAMPLE_URLS[index % len(SAMPLE_URLS)]}#{index}"
+            for index in range(number)
+        ]
+
+        seconds = timeit.timeit(lambda: [legacy_check(url) for url in urls], number=1)
+        self.report("Прежняя проверка (re.compile на вызов)", seconds, number)
+
+        seconds = timeit.timeit(
+            lambda: [check_video_url(url) for url in urls], number=1
+        )
+        self.report("check_video_url", seconds, number)
+
+        batch_size = options["batch_size"]
+        seconds = timeit.timeit(
+            lambda: [
+                validate_video_urls(urls[start:end])
+                for start, end in zip(
+                    range(0, number, batch_size),
+                    range(batch_size, number + batch_size, batch_size),
+                )
+            ],
+            number=1,
+        )
+        self.report(f"validate_video_urls, пакеты по {batch_size}", seconds, number)
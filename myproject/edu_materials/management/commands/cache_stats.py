@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from edu_materials.caching import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    """Команда вывода счетчиков попаданий и промахов кеша ответов курсов и уроков."""
+
+    help = "Показывает статистику кеша ответов курсов и уроков"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Обнулить счетчики после вывода"
+        )
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}, misses: {stats['misses']}, "
+            f"hit ratio: {stats['hit_ratio']}"
+        )
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены"))
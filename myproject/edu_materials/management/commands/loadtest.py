@@ -0,0 +1,97 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+DEFAULT_PATHS = ("courses/", "lessons/")
+
+
+class Command(BaseCommand):
+    """Команда нагрузочного тестирования запущенного сервера: выполняет GET-запросы
+    к спискам курсов и уроков в несколько потоков и выводит запросы в секунду
+    и задержку p50/p95 для каждого адреса.
+    Несколько --base-url позволяют сравнить runserver и gunicorn, например:
+    python manage.py loadtest --email admin@sky.pro
+    --base-url http://localhost:8001/ --base-url http://localhost:8000/"""
+
+    help = "Измеряет запросы в секунду к /courses/ и /lessons/ запущенного сервера"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", action="append", dest="base_urls")
+        parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--warmup", type=int, default=50)
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument("--token", help="Access-токен JWT")
+        parser.add_argument(
+            "--email", help="Почта пользователя, для которого выпускается токен"
+        )
+
+    def get_token(self, options):
+        """Метод возвращает access-токен из параметров или выпускает его
+        для существующего пользователя без обращения к API."""
+        if options["token"]:
+            return options["token"]
+        if not options["email"]:
+            raise CommandError("Укажите --token или --email")
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['email']} не найден")
+        return str(AccessToken.for_user(user))
+
+    def run(self, url, headers, total, concurrency, timeout):
+        """Метод выполняет total запросов в concurrency потоков, у каждого потока
+        своя сессия с keep-alive. Возвращает длительность, задержки и число ошибок."""
+        local = threading.local()
+
+        def fetch(_):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+                session.headers.update(headers)
+            started = time.perf_counter()
+            try:
+                response = session.get(url, timeout=timeout)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fetch, range(total)))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        return elapsed, latencies, errors
+
+    def handle(self, *args, **options):
+        base_urls = options["base_urls"] or ["http://localhost:8000/"]
+        headers = {"Authorization": f"Bearer {self.get_token(options)}"}
+        concurrency = options["concurrency"]
+        total = options["requests"]
+
+        for base_url in base_urls:
+            for path in options["paths"]:
+                url = urljoin(base_url, path)
+                self.run(
+                    url, headers, options["warmup"], concurrency, options["timeout"]
+                )
+                elapsed, latencies, errors = self.run(
+                    url, headers, total, concurrency, options["timeout"]
+                )
+                quantiles = statistics.quantiles(latencies, n=100)
+                self.stdout.write(
+                    f"{url}: {total / elapsed:.1f} запр/с, "
+                    f"p50 {quantiles[49] * 1000:.1f} мс, "
+                    f"p95 {quantiles[94] * 1000:.1f} мс, "
+                    f"ошибок {errors} из {total}"
+                )
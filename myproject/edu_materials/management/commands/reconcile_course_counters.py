@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from edu_materials.caching import bump_generations_on_commit
+from edu_materials.models import Course, Lesson, count_subquery
+from users.models import Subscription
+
+
+class Command(BaseCommand):
+    """Команда пересчета счетчиков уроков и подписчиков курсов одним UPDATE.
+    Закешированные ответы по исправленным курсам сбрасываются."""
+
+    help = "Исправляет расхождения счетчиков уроков и подписчиков курсов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать количество курсов с расхождениями",
+        )
+
+    def handle(self, *args, **options):
+        actual_lessons = count_subquery(Lesson.objects.all(), "course")
+        actual_subscribers = count_subquery(Subscription.objects.all(), "course")
+        drifted = Course.objects.annotate(
+            actual_lessons=actual_lessons, actual_subscribers=actual_subscribers
+        ).filter(
+            ~Q(lessons_count=actual_lessons) | ~Q(subscribers_count=actual_subscribers)
+        )
+
+        if options["dry_run"]:
+            self.stdout.write(f"Курсов с расхождениями: {drifted.count()}")
+            return
+
+        course_ids = list(drifted.values_list("pk", flat=True))
+        updated = Course.objects.filter(pk__in=course_ids).update(
+            lessons_count=actual_lessons, subscribers_count=actual_subscribers
+        )
+        if course_ids:
+            bump_generations_on_commit(
+                "courses", *[f"course:{pk}" for pk in course_ids]
+            )
+        self.stdout.write(self.style.SUCCESS(f"Исправлено курсов: {updated}"))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:42
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_course_counters(apps, schema_editor):
+    """Заполняет счетчики уроков и подписчиков существующих курсов."""
+
+    Course = apps.get_model("edu_materials", "Course")
+    Lesson = apps.get_model("edu_materials", "Lesson")
+    Subscription = apps.get_model("users", "Subscription")
+
+    def count(model):
+        counter = (
+            model.objects.filter(course=OuterRef("pk"))
+            .order_by()
+            .values("course")
+            .annotate(amount=Count("pk"))
+            .values("amount")
+        )
+        return Coalesce(Subquery(counter, output_field=IntegerField()), 0)
+
+    Course.objects.update(
+        lessons_count=count(Lesson), subscribers_count=count(Subscription)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edu_materials", "0004_keyset_pagination_indexes"),
+        ("users", "0002_alter_user_is_active_alter_user_is_staff_payment_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="lessons_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество уроков"
+            ),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="subscribers_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество подписчиков"
+            ),
+        ),
+        migrations.RunPython(fill_course_counters, migrations.RunPython.noop),
+    ]
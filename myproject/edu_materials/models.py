@@ -1,4 +1,10 @@
+from collections import defaultdict
+
 from django.db import models
+from django.db.models import DEFERRED
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
 
 from config.settings import AUTH_USER_MODEL
 
@@ -40,14 +46,88 @@ class Course(models.Model):
     updated_at = models.DateTimeField(
         auto_now=True, null=True, blank=True, verbose_name="Дата изменения"
     )
+    lessons_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество уроков"
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество подписчиков"
+    )
+
+    COUNTER_FIELDS = ("lessons_count", "subscribers_count")
 
     class Meta:
         verbose_name = "Курс"
         verbose_name_plural = "Курсы"
+        indexes = [
+            models.Index(fields=["owner", "id"], name="course_owner_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Метод сохранения курса. Счетчики уроков и подписчиков изменяются только
+        атомарными UPDATE (adjust_counter, apply_counter_deltas, пересчет),
+        поэтому при изменении курса они не записываются: иначе сохранение
+        загруженного ранее экземпляра перезаписало бы накопленные изменения."""
+        if not self._state.adding:
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs["update_fields"] = [
+                name for name in update_fields if name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def adjust_counter(cls, course_id, field, delta):
+        """Метод атомарно изменяет счетчик курса на delta одним UPDATE."""
+        if course_id is not None:
+            cls.adjust_counters([course_id], field, delta)
+
+    @classmethod
+    def adjust_counters(cls, course_ids, field, delta):
+        """Метод атомарно изменяет счетчик нескольких курсов на delta одним UPDATE."""
+        if not course_ids or not delta:
+            return
+        cls.objects.filter(pk__in=course_ids).update(
+            **{field: Greatest(F(field) + delta, Value(0))}
+        )
+
+    @classmethod
+    def apply_counter_deltas(cls, field, deltas):
+        """Метод применяет изменения счетчика {id курса: delta},
+        одним UPDATE на каждое различное значение delta."""
+        courses_by_delta = defaultdict(list)
+        for course_id, delta in deltas.items():
+            if course_id is not None and delta:
+                courses_by_delta[delta].append(course_id)
+        for delta, course_ids in courses_by_delta.items():
+            cls.adjust_counters(course_ids, field, delta)
+
+
+def count_subquery(queryset, field):
+    """Возвращает подзапрос с количеством связанных записей для аннотации по "pk"."""
+    counter = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(amount=Count("pk"))
+        .values("amount")
+    )
+    return Coalesce(Subquery(counter, output_field=IntegerField()), 0)
+
+
+# Сигнал массового сохранения уроков через bulk_create/bulk_update,
+# которые не отправляют post_save. Аргументы: lessons - сохраненные уроки,
+# created - True для созданных уроков.
+lessons_bulk_saved = Signal()
+
 
 class Lesson(models.Model):
     """Создание модели лекции с соответствующими полями"""
@@ -106,6 +186,34 @@ class Lesson(models.Model):
     class Meta:
         verbose_name = "Урок"
         verbose_name_plural = "Уроки"
+        indexes = [
+            models.Index(fields=["owner", "id"], name="lesson_owner_id_idx"),
+            models.Index(fields=["course", "id"], name="lesson_course_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Метод запоминает курс урока на момент загрузки из базы данных.
+        Если курс не загружен (only/defer), запоминается DEFERRED."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_course_id = instance.__dict__.get("course_id", DEFERRED)
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Метод сохранения урока, обновляет запомненный курс урока.
+        Если прежний курс неизвестен (урок загружен без курса или создан
+        в коде с существующим pk) и курс задан, прежний курс читается
+        из базы данных до сохранения."""
+        course_assigned = "course_id" not in self.get_deferred_fields()
+        loaded = getattr(self, "_loaded_course_id", DEFERRED)
+        if course_assigned and loaded is DEFERRED and self.pk is not None:
+            self._loaded_course_id = (
+                Lesson.objects.filter(pk=self.pk)
+                .values_list("course_id", flat=True)
+                .first()
+            )
+        super().save(*args, **kwargs)
+        self._loaded_course_id = self.__dict__.get("course_id", DEFERRED)
@@ -1,7 +1,47 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class LMSPagination(PageNumberPagination):
     page_size = 3
     page_size_query_param = "page_size"
     max_page_size = 10
+
+
+class LMSCursorPagination(CursorPagination):
+    """Курсорная (keyset) пагинация: без COUNT(*) и OFFSET,
+    следующая страница выбирается по индексу от последней записи."""
+
+    page_size = 3
+    page_size_query_param = "page_size"
+    max_page_size = 10
+    ordering = "-id"
+
+
+class KeysetPaginationMixin:
+    """Примесь выбора курсорной пагинации для контроллера.
+    Курсорная пагинация включается параметром запроса ?pagination=cursor
+    (или наличием параметра cursor) либо по умолчанию для контроллера
+    через атрибут keyset_pagination = True."""
+
+    cursor_pagination_class = LMSCursorPagination
+    cursor_ordering = None
+    keyset_pagination = False
+
+    def use_keyset_pagination(self):
+        """Метод определяет, нужна ли курсорная пагинация для текущего запроса."""
+        params = self.request.query_params
+        if "cursor" in params:
+            return True
+        default_mode = "cursor" if self.keyset_pagination else "page"
+        return params.get("pagination", default_mode) == "cursor"
+
+    @property
+    def paginator(self):
+        """Свойство возвращает экземпляр пагинатора для текущего запроса."""
+        if not hasattr(self, "_paginator"):
+            if not self.use_keyset_pagination():
+                return super().paginator
+            self._paginator = self.cursor_pagination_class()
+            if self.cursor_ordering:
+                self._paginator.ordering = self.cursor_ordering
+        return self._paginator
@@ -1,11 +1,94 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from drf_spectacular.utils import OpenApiExample, extend_schema_serializer
 from rest_framework import serializers
 
-from .models import Course, Lesson
-from .validators import URLValidator
+from .models import Course, Lesson, lessons_bulk_saved
+from .validators import URLValidator, validate_video_urls
 from users.models import Subscription
 
 
+class LessonListSerializer(serializers.ListSerializer):
+    """Сериализатор списка уроков для массового создания и изменения:
+    все уроки проверяются, затем записываются одним bulk_create или bulk_update
+    в одной транзакции."""
+
+    def get_instance_map(self):
+        """Метод возвращает изменяемые уроки по их идентификаторам."""
+        if not hasattr(self, "_instance_map"):
+            self._instance_map = {lesson.pk: lesson for lesson in self.instance}
+        return self._instance_map
+
+    def run_child_validation(self, data):
+        """Метод проверяет урок списка, при изменении - вместе с изменяемым уроком."""
+        if self.instance is None:
+            return super().run_child_validation(data)
+        lesson_id = data.get("id") if isinstance(data, dict) else None
+        self.child.instance = self.get_instance_map().get(lesson_id)
+        if self.child.instance is None:
+            raise serializers.ValidationError({"id": "Урок не найден."})
+        self.child.initial_data = data
+        validated = super().run_child_validation(data)
+        validated["id"] = lesson_id
+        return validated
+
+    def to_internal_value(self, data):
+        """Метод проверяет уроки списка, затем ссылки на видео всех уроков
+        одним пакетом validate_video_urls."""
+        value = super().to_internal_value(data)
+        url_errors = validate_video_urls([item.get("video_url") for item in value])
+        if url_errors:
+            raise serializers.ValidationError(
+                [
+                    {"video_url": [url_errors[index]]} if index in url_errors else {}
+                    for index in range(len(value))
+                ]
+            )
+        return value
+
+    def validate(self, attrs):
+        """Метод проверяет, что каждый урок изменяется в запросе один раз."""
+        lesson_ids = [item["id"] for item in attrs if "id" in item]
+        if len(lesson_ids) != len(set(lesson_ids)):
+            raise serializers.ValidationError("Урок указан в списке несколько раз.")
+        return attrs
+
+    def create(self, validated_data):
+        """Метод создает уроки одним bulk_create."""
+        lessons = [Lesson(**item) for item in validated_data]
+        with transaction.atomic():
+            Lesson.objects.bulk_create(
+                lessons, batch_size=settings.LESSONS_BULK_BATCH_SIZE
+            )
+            lessons_bulk_saved.send(sender=Lesson, lessons=lessons, created=True)
+        for lesson in lessons:
+            lesson._loaded_course_id = lesson.course_id
+        return lessons
+
+    def update(self, instance, validated_data):
+        """Метод изменяет уроки одним bulk_update по объединению измененных полей."""
+        instance_map = self.get_instance_map()
+        lessons = []
+        fields = {"updated_at"}
+        now = timezone.now()
+        for item in validated_data:
+            lesson = instance_map[item.pop("id")]
+            for field, value in item.items():
+                setattr(lesson, field, value)
+            lesson.updated_at = now
+            fields.update(item)
+            lessons.append(lesson)
+        with transaction.atomic():
+            Lesson.objects.bulk_update(
+                lessons, sorted(fields), batch_size=settings.LESSONS_BULK_BATCH_SIZE
+            )
+            lessons_bulk_saved.send(sender=Lesson, lessons=lessons, created=False)
+        for lesson in lessons:
+            lesson._loaded_course_id = lesson.course_id
+        return lessons
+
+
 @extend_schema_serializer(
     examples=[
         OpenApiExample(
@@ -28,6 +111,19 @@ class LessonSerializer(serializers.ModelSerializer):
         model = Lesson
         fields = "__all__"
         validators = [URLValidator(field="video_url")]
+        list_serializer_class = LessonListSerializer
+
+    def get_validators(self):
+        """Метод возвращает валидаторы урока. В массовом импорте ссылки на видео
+        проверяет LessonListSerializer для всего списка сразу."""
+        validators = super().get_validators()
+        if isinstance(self.parent, LessonListSerializer):
+            return [
+                validator
+                for validator in validators
+                if not isinstance(validator, URLValidator)
+            ]
+        return validators
 
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -43,22 +139,24 @@ class CourseSerializer(serializers.ModelSerializer):
         """Класс для изменения поведения полей сериализатора модели "Курс"."""
 
         model = Course
-        fields = "__all__"
+        exclude = ("lessons_count", "subscribers_count")
 
     def get_amount_of_lessons(self, course):
         """Метод для вывода информации о количестве уроков в курсе."""
-        return Lesson.objects.filter(course=course).count()
+        return course.lessons_count
 
     def get_count_subscriptions(self, instance):
         """Метод для вывода информации о количестве подписок на курс."""
-        return f"Подписок - {Subscription.objects.filter(course=instance).count()}."
+        return f"Подписок - {instance.subscribers_count}."
 
     def get_is_subscribed(self, course):
         """Метод для вывода информации о подписке текущего пользователя на курс."""
-        user = self.context["request"].user
-        subscription = (
-            Subscription.objects.all().filter(owner=user, course=course).exists()
-        )
+        subscription = getattr(course, "user_subscribed", None)
+        if subscription is None:
+            user = self.context["request"].user
+            subscription = Subscription.objects.filter(
+                owner=user, course=course
+            ).exists()
         if subscription:
             return "У Вас есть подписка на данный курс."
         return False
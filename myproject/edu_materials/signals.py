@@ -0,0 +1,151 @@
+from collections import Counter
+
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import Subscription, User, subscriptions_changed
+from .caching import bump_generations_on_commit
+from .models import Course, Lesson, lessons_bulk_saved
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    """Сбрасывает закешированные ответы по курсу при его изменении или удалении."""
+
+    bump_generations_on_commit("courses", f"course:{instance.pk}")
+
+
+@receiver(pre_delete, sender=Course)
+def invalidate_course_lessons(sender, instance, **kwargs):
+    """Сбрасывает закешированные уроки курса, у которых при удалении курса обнулится ссылка."""
+
+    lesson_ids = list(instance.lessons.values_list("pk", flat=True))
+    bump_generations_on_commit("lessons", *[f"lesson:{pk}" for pk in lesson_ids])
+
+
+def loaded_course_id(lesson, created=False):
+    """Функция возвращает курс урока на момент загрузки из базы данных:
+    None для нового урока, DEFERRED, если прежний курс неизвестен."""
+    return None if created else getattr(lesson, "_loaded_course_id", DEFERRED)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson(sender, instance, **kwargs):
+    """Сбрасывает закешированные ответы по уроку и курсам, в которые он входит или входил."""
+
+    course_ids = {instance.course_id, loaded_course_id(instance)}
+    bump_generations_on_commit(
+        "lessons",
+        f"lesson:{instance.pk}",
+        "courses",
+        *[f"course:{pk}" for pk in course_ids if pk not in (None, DEFERRED)],
+    )
+
+
+@receiver(lessons_bulk_saved, sender=Lesson)
+def invalidate_bulk_saved_lessons(sender, lessons, **kwargs):
+    """Сбрасывает закешированные ответы по урокам и их курсам
+    после массового сохранения уроков."""
+
+    course_ids = {
+        pk
+        for lesson in lessons
+        for pk in (lesson.course_id, loaded_course_id(lesson))
+        if pk not in (None, DEFERRED)
+    }
+    bump_generations_on_commit(
+        "lessons",
+        *[f"lesson:{lesson.pk}" for lesson in lessons],
+        "courses",
+        *[f"course:{pk}" for pk in course_ids],
+    )
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription(sender, instance, **kwargs):
+    """Сбрасывает закешированные ответы по курсу при изменении подписки на него."""
+
+    bump_generations_on_commit("courses", f"course:{instance.course_id}")
+
+
+@receiver(post_save, sender=Lesson)
+def count_saved_lesson(sender, instance, created, **kwargs):
+    """Обновляет счетчики уроков курсов при создании урока или переносе в другой курс."""
+
+    previous_course_id = loaded_course_id(instance, created)
+    if previous_course_id is DEFERRED:
+        return
+    if previous_course_id != instance.course_id:
+        Course.adjust_counter(previous_course_id, "lessons_count", -1)
+        Course.adjust_counter(instance.course_id, "lessons_count", 1)
+
+
+@receiver(post_delete, sender=Lesson)
+def count_deleted_lesson(sender, instance, **kwargs):
+    """Уменьшает счетчик уроков курса при удалении урока."""
+
+    Course.adjust_counter(instance.course_id, "lessons_count", -1)
+
+
+@receiver(lessons_bulk_saved, sender=Lesson)
+def count_bulk_saved_lessons(sender, lessons, created, **kwargs):
+    """Обновляет счетчики уроков курсов после массового создания уроков
+    или переноса уроков в другие курсы."""
+
+    deltas = Counter()
+    for lesson in lessons:
+        previous_course_id = loaded_course_id(lesson, created)
+        if previous_course_id is DEFERRED:
+            continue
+        if previous_course_id != lesson.course_id:
+            deltas[previous_course_id] -= 1
+            deltas[lesson.course_id] += 1
+    Course.apply_counter_deltas("lessons_count", deltas)
+
+
+@receiver(post_save, sender=Subscription)
+def count_saved_subscription(sender, instance, created, **kwargs):
+    """Увеличивает счетчик подписчиков курса при создании подписки."""
+
+    if created:
+        Course.adjust_counter(instance.course_id, "subscribers_count", 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def count_deleted_subscription(sender, instance, origin=None, **kwargs):
+    """Уменьшает счетчик подписчиков курса при удалении подписки.
+    При каскадном удалении пользователя счетчики уже уменьшены одним UPDATE
+    в count_deleted_user_subscriptions, при удалении курса счетчик не нужен."""
+
+    deleted_model = getattr(origin, "model", type(origin))
+    if deleted_model is Subscription:
+        Course.adjust_counter(instance.course_id, "subscribers_count", -1)
+
+
+@receiver(pre_delete, sender=User)
+def count_deleted_user_subscriptions(sender, instance, **kwargs):
+    """Уменьшает счетчики подписчиков курсов пользователя одним UPDATE
+    перед каскадным удалением его подписок."""
+
+    course_ids = list(
+        Subscription.objects.filter(owner=instance, course__isnull=False)
+        .order_by()
+        .values_list("course_id", flat=True)
+    )
+    Course.adjust_counters(course_ids, "subscribers_count", -1)
+
+
+@receiver(subscriptions_changed, sender=Subscription)
+def count_changed_subscriptions(sender, subscribed, unsubscribed, **kwargs):
+    """Обновляет счетчики подписчиков и сбрасывает кеш курсов
+    после массовой подписки или отписки."""
+
+    Course.adjust_counters(subscribed, "subscribers_count", 1)
+    Course.adjust_counters(unsubscribed, "subscribers_count", -1)
+    bump_generations_on_commit(
+        "courses", *[f"course:{pk}" for pk in [*subscribed, *unsubscribed]]
+    )
@@ -1,9 +1,20 @@
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.fields import DateTimeField
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
+from .caching import get_cache_stats
 from .models import Course, Lesson
-from users.models import User
+from .validators import check_video_url, validate_video_urls
+from users.models import Subscription, User
 
 
 class TestCase(APITestCase):
@@ -12,6 +23,7 @@ class TestCase(APITestCase):
     def setUp(self):
         """Задает начальные данные для тестов."""
 
+        cache.clear()
         self.user = User.objects.create(email="admin@sky.pro")
         video_url = "https://www.youtube.com/"
         self.course = Course.objects.create(
@@ -49,7 +61,7 @@ class CourseTestCase(TestCase, APITestCase):
                 {
                     "id": self.course.pk,
                     "amount_of_lessons": 1,
-                    "lesson": [
+                    "lessons": [
                         {
                             "id": self.lesson.pk,
                             "name": self.lesson.name,
@@ -124,6 +136,266 @@ class CourseTestCase(TestCase, APITestCase):
         self.assertEqual(Course.objects.count(), 0)
 
 
+class CourseQueryCountTestCase(TestCase, APITestCase):
+    """Тесты количества запросов к базе данных при выводе курсов."""
+
+    def test_course_list_query_count_is_constant(self):
+        """Тест: количество запросов не зависит от размера страницы."""
+
+        subscriber = User.objects.create(email="subscriber@sky.pro")
+        for number in range(9):
+            course = Course.objects.create(name=f"Course {number}", owner=self.user)
+            Lesson.objects.create(
+                name=f"Lesson {number}", course=course, owner=self.user
+            )
+            Subscription.objects.create(owner=subscriber, course=course)
+            Subscription.objects.create(owner=self.user, course=course)
+
+        url = reverse("edu_materials:courses-list")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url, {"page_size": 1})
+        self.assertEqual(len(response.json()["results"]), 1)
+
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.client.get(url, {"page_size": 10})
+        results = response.json()["results"]
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(len(small_page), len(full_page))
+        self.assertEqual(results[1]["amount_of_lessons"], 1)
+        self.assertEqual(results[1]["count_subscriptions"], "Подписок - 2.")
+        self.assertEqual(
+            results[1]["is_subscribed"], "У Вас есть подписка на данный курс."
+        )
+
+
+class ResponseCacheTestCase(TestCase, APITestCase):
+    """Тесты кеширования ответов по курсам и урокам."""
+
+    def test_course_retrieve_cached_until_change(self):
+        """Тест: повторный запрос курса отдается из кеша до изменения курса."""
+
+        url = reverse("edu_materials:courses-detail", args=[self.course.pk])
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(owner=self.user, course=self.course)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["count_subscriptions"], "Подписок - 1.")
+        self.assertEqual(get_cache_stats()["hits"], 1)
+        self.assertEqual(get_cache_stats()["misses"], 2)
+
+    def test_lesson_change_invalidates_course_and_lesson(self):
+        """Тест: изменение урока сбрасывает кеш урока, списка уроков и курса."""
+
+        course_url = reverse("edu_materials:courses-detail", args=[self.course.pk])
+        lesson_url = reverse("edu_materials:lesson_detail", args=[self.lesson.pk])
+        list_url = reverse("edu_materials:lesson_list")
+        for url in (course_url, lesson_url, list_url):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.name = "Renamed lesson"
+            self.lesson.save()
+            self.assertEqual(self.client.get(lesson_url)["X-Cache"], "HIT")
+
+        for url in (course_url, lesson_url, list_url):
+            response = self.client.get(url)
+            self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["name"], "Renamed lesson")
+
+    def test_cache_is_scoped_by_user(self):
+        """Тест: закешированный ответ не выдается другому пользователю."""
+
+        url = reverse("edu_materials:courses-detail", args=[self.course.pk])
+        self.client.get(url)
+
+        other_user = User.objects.create(email="other@sky.pro")
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class KeysetPaginationTestCase(TestCase, APITestCase):
+    """Тесты курсорной пагинации списков."""
+
+    def test_lesson_list_cursor_pagination(self):
+        """Тест: курсорная пагинация обходит все уроки без запроса COUNT(*)."""
+
+        for number in range(4):
+            Lesson.objects.create(
+                name=f"Lesson {number}", course=self.course, owner=self.user
+            )
+
+        url = reverse("edu_materials:lesson_list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"pagination": "cursor"})
+        data = response.json()
+        self.assertNotIn("count", data)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+        names = [lesson["name"] for lesson in data["results"]]
+        while data["next"]:
+            data = self.client.get(data["next"]).json()
+            names.extend(lesson["name"] for lesson in data["results"])
+        self.assertEqual(len(names), 5)
+        self.assertEqual(names[0], self.lesson.name)
+
+    def test_course_list_page_number_by_default(self):
+        """Тест: без параметра используется постраничная пагинация."""
+
+        url = reverse("edu_materials:courses-list")
+        response = self.client.get(url)
+        self.assertEqual(response.json()["count"], 1)
+
+
+class CourseUpdateNotificationTestCase(TestCase, APITestCase):
+    """Тесты отложенной рассылки об обновлении курса."""
+
+    @override_settings(COURSE_UPDATE_QUIET_WINDOW=600)
+    def test_burst_of_edits_schedules_single_notification(self):
+        """Тест: серия правок курса ставит одну отложенную рассылку
+        и не добавляет лишних UPDATE-запросов."""
+
+        url = reverse("edu_materials:courses-detail", args=[self.course.pk])
+        with mock.patch(
+            "users.tasks.flush_course_update.apply_async"
+        ) as flush, CaptureQueriesContext(connection) as queries:
+            for number in range(50):
+                self.client.patch(url, {"name": f"Course {number}"})
+
+        flush.assert_called_once_with(args=[self.course.pk], countdown=600)
+        updates = [query for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 50)
+
+    def test_notification_sent_after_quiet_window(self):
+        """Тест: после окна тишины подписчики получают письмо."""
+
+        Subscription.objects.create(owner=self.user, course=self.course)
+        url = reverse("edu_materials:courses-detail", args=[self.course.pk])
+        self.client.patch(url, {"name": "Updated course"})
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+
+
+class CourseCountersTestCase(TestCase, APITestCase):
+    """Тесты счетчиков уроков и подписчиков курса."""
+
+    def test_counters_follow_lessons_and_subscriptions(self):
+        """Тест: счетчики обновляются при создании, переносе и удалении."""
+
+        other_course = Course.objects.create(name="Other course", owner=self.user)
+        Subscription.objects.create(owner=self.user, course=self.course)
+        self.client.post(reverse("users:subscription"), {"course": other_course.pk})
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 1)
+        self.assertEqual(self.course.subscribers_count, 1)
+
+        self.lesson.course = other_course
+        self.lesson.save()
+        self.client.post(reverse("users:subscription"), {"course": other_course.pk})
+        self.course.refresh_from_db()
+        other_course.refresh_from_db()
+        self.assertEqual(
+            (self.course.lessons_count, other_course.lessons_count), (0, 1)
+        )
+        self.assertEqual(other_course.subscribers_count, 0)
+
+        self.lesson.delete()
+        other_course.refresh_from_db()
+        self.assertEqual(other_course.lessons_count, 0)
+
+    def test_course_save_keeps_counters(self):
+        """Тест: сохранение загруженного ранее курса не перезаписывает счетчики."""
+
+        stale_course = Course.objects.get(pk=self.course.pk)
+        Subscription.objects.create(owner=self.user, course=self.course)
+        stale_course.name = "Renamed course"
+        stale_course.save()
+        response = self.client.patch(
+            reverse("edu_materials:courses-detail", args=[self.course.pk]),
+            {"description": "new"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.name, "Renamed course")
+        self.assertEqual(
+            (self.course.lessons_count, self.course.subscribers_count), (1, 1)
+        )
+
+    def test_counters_with_deferred_course(self):
+        """Тест: сохранение урока, загруженного без курса, не меняет счетчики,
+        а перенос такого урока учитывает прежний курс."""
+
+        other_course = Course.objects.create(name="Other course", owner=self.user)
+        Lesson.objects.only("name").get(pk=self.lesson.pk).save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 1)
+
+        lesson = Lesson.objects.only("name").get(pk=self.lesson.pk)
+        lesson.course = other_course
+        lesson.save()
+        self.course.refresh_from_db()
+        other_course.refresh_from_db()
+        self.assertEqual(
+            (self.course.lessons_count, other_course.lessons_count), (0, 1)
+        )
+
+    def test_reconcile_counters(self):
+        """Тест: команда пересчета исправляет расхождения счетчиков."""
+
+        url = reverse("edu_materials:courses-detail", args=[self.course.pk])
+        Course.objects.update(lessons_count=5, subscribers_count=3)
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("reconcile_course_counters", stdout=StringIO())
+        self.course.refresh_from_db()
+        self.assertEqual(
+            (self.course.lessons_count, self.course.subscribers_count), (1, 0)
+        )
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_lesson_saved_without_loading_keeps_counter(self):
+        """Тест: сохранение урока, созданного в коде с существующим pk,
+        не увеличивает счетчик уроков повторно."""
+
+        Lesson(pk=self.lesson.pk, name="Same lesson", course=self.course).save()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 1)
+
+    def test_user_delete_updates_subscribers_once(self):
+        """Тест: при удалении пользователя счетчики подписчиков всех его курсов
+        уменьшаются одним UPDATE."""
+
+        other_course = Course.objects.create(name="Other course", owner=self.user)
+        subscriber = User.objects.create(email="subscriber@sky.pro")
+        for course in (self.course, other_course):
+            Subscription.objects.create(owner=subscriber, course=course)
+
+        with CaptureQueriesContext(connection) as queries:
+            subscriber.delete()
+        counter_updates = [
+            query
+            for query in queries.captured_queries
+            if "subscribers_count" in query["sql"] and "UPDATE" in query["sql"]
+        ]
+        self.assertEqual(len(counter_updates), 1)
+        self.assertEqual(
+            list(
+                Course.objects.filter(
+                    pk__in=[self.course.pk, other_course.pk]
+                ).values_list("subscribers_count", flat=True)
+            ),
+            [0, 0],
+        )
+
+
 class LessonTestCase(TestCase, APITestCase):
     """Тесты для работы с уроками."""
 
@@ -207,3 +479,158 @@ class LessonTestCase(TestCase, APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Lesson.objects.count(), 0)
+
+
+class VideoURLValidatorTestCase(TestCase, APITestCase):
+    """Тесты проверки ссылок на видео уроков."""
+
+    def test_allowed_urls(self):
+        """Тест: ссылки на разрешенный домен и его поддомены допустимы."""
+
+        for url in (
+            "https://www.youtube.com/watch?v=1",
+            "http://youtube.com/lesson",
+            "youtube.com/lesson",
+            "https://m.YouTube.com",
+        ):
+            with self.subTest(url=url):
+                self.assertIsNone(check_video_url(url))
+
+    def test_rejected_urls(self):
+        """Тест: некорректные ссылки и ссылки на другие домены отклоняются."""
+
+        for url in (
+            "https://youtube.com.example.org/lesson",
+            "https://notyoutube.com/lesson",
+            "ftp://youtube.com/lesson",
+            "https://user@youtube.com/lesson",
+            "https://you tube.com",
+            "not a url",
+        ):
+            with self.subTest(url=url):
+                self.assertIsNotNone(check_video_url(url))
+
+    @override_settings(ALLOWED_LESSON_DOMAINS=("vimeo.com", "rutube.ru"))
+    def test_batch_validation_uses_settings(self):
+        """Тест: пакетная проверка учитывает ALLOWED_LESSON_DOMAINS
+        и возвращает ошибки по позициям ссылок."""
+
+        errors = validate_video_urls(
+            [
+                "https://vimeo.com/1",
+                "https://www.youtube.com/1",
+                None,
+                "https://rutube.ru/2",
+                "https://www.youtube.com/2",
+            ]
+        )
+        self.assertEqual(sorted(errors), [1, 4])
+
+    def test_partial_update_without_url(self):
+        """Тест: частичное обновление урока без ссылки не требует ее проверки."""
+
+        url = reverse("edu_materials:update_lesson", args=(self.lesson.pk,))
+        response = self.client.patch(url, data={"name": "Renamed"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_forbidden_domain_rejected_by_api(self):
+        """Тест: урок со ссылкой на неразрешенный домен не создается."""
+
+        response = self.client.post(
+            reverse("edu_materials:create_lesson"),
+            data={"name": "Lesson", "video_url": "https://example.com/video"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LessonBulkTestCase(TestCase, APITestCase):
+    """Тесты массового создания и изменения уроков."""
+
+    def setUp(self):
+        """Создает второй курс и подписчика первого курса."""
+
+        super().setUp()
+        self.other_course = Course.objects.create(name="Other", owner=self.user)
+        subscriber = User.objects.create(email="subscriber@sky.pro")
+        Subscription.objects.create(owner=subscriber, course=self.course)
+        self.url = reverse("edu_materials:bulk_lessons")
+
+    def test_bulk_create(self):
+        """Тест: уроки создаются одним INSERT, счетчик курса обновляется,
+        подписчики получают одно уведомление."""
+
+        data = [
+            {
+                "name": f"Bulk {number}",
+                "course": self.course.pk,
+                "video_url": "https://www.youtube.com/bulk",
+            }
+            for number in range(20)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()), 20)
+        inserts = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "edu_materials_lesson"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Lesson.objects.filter(owner=self.user).count(), 21)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 21)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_bulk_create_is_atomic(self):
+        """Тест: при ошибке в одном уроке не создается ни один."""
+
+        data = [
+            {"name": "Valid", "course": self.course.pk},
+            {"name": "Invalid", "video_url": "https://example.com/video"},
+        ]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn("video_url", response.json()[1])
+        self.assertEqual(Lesson.objects.count(), 1)
+
+    def test_bulk_update(self):
+        """Тест: уроки изменяются одним UPDATE, перенос в другой курс
+        обновляет счетчики обоих курсов."""
+
+        second = Lesson.objects.create(
+            name="Second", course=self.course, owner=self.user
+        )
+        data = [
+            {"id": self.lesson.pk, "name": "Renamed"},
+            {"id": second.pk, "course": self.other_course.pk},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "edu_materials_lesson"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.lesson.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(self.lesson.name, "Renamed")
+        self.assertEqual(second.course, self.other_course)
+        counters = dict(Course.objects.values_list("pk", "lessons_count"))
+        self.assertEqual(counters, {self.course.pk: 1, self.other_course.pk: 1})
+
+    def test_bulk_update_foreign_lesson(self):
+        """Тест: чужой урок изменить нельзя."""
+
+        foreign = Lesson.objects.create(
+            name="Foreign", owner=User.objects.create(email="foreign@sky.pro")
+        )
+        response = self.client.patch(
+            self.url, [{"id": foreign.pk, "name": "Hacked"}], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.name, "Foreign")
@@ -4,6 +4,7 @@ from rest_framework.routers import DefaultRouter
 from .apps import EduMaterialsConfig
 from .views import (
     CourseViewSet,
+    LessonBulkAPIView,
     LessonCreateAPIView,
     LessonDestroyAPIView,
     LessonListAPIView,
@@ -18,6 +19,7 @@ router.register(r"courses", CourseViewSet, basename="courses")
 
 urlpatterns = [
     path("lessons/new", LessonCreateAPIView.as_view(), name="create_lesson"),
+    path("lessons/bulk", LessonBulkAPIView.as_view(), name="bulk_lessons"),
     path("lessons/", LessonListAPIView.as_view(), name="lesson_list"),
     path("lessons/<int:pk>/", LessonRetrieveAPIView.as_view(), name="lesson_detail"),
     path(
@@ -1,6 +1,106 @@
 import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from rest_framework.serializers import ValidationError
 
+# Выражение компилируется один раз при импорте модуля: необязательная схема http(s),
+# имя хоста (группа host), необязательный порт и путь без пробелов и "@"
+URL_RE = re.compile(
+    r"^(?:https?:)?(?://)?(?P<host>[A-Za-z0-9.-]+\.[A-Za-z0-9-]{2,63})"
+    r"(?::\d{1,5})?(?:[/?#][^\s@]*)?$"
+)
+
+INVALID_URL_MESSAGE = "Ссылка не корректна. Не корректный формат ссылки."
+FORBIDDEN_DOMAIN_MESSAGE = "Ссылка на видео разрешена только с сайтов: {domains}."
+
+_allowed_domains = None
+
+
+def get_allowed_domains():
+    """Функция возвращает множество разрешенных доменов из
+    settings.ALLOWED_LESSON_DOMAINS, построенное один раз на процесс."""
+    global _allowed_domains
+    if _allowed_domains is None:
+        _allowed_domains = frozenset(
+            domain.strip().lower().lstrip(".")
+            for domain in settings.ALLOWED_LESSON_DOMAINS
+            if domain.strip()
+        )
+    return _allowed_domains
+
+
+@receiver(setting_changed)
+def reset_allowed_domains(setting, **kwargs):
+    """Сбрасывает множество разрешенных доменов при изменении настроек в тестах."""
+    global _allowed_domains
+    if setting == "ALLOWED_LESSON_DOMAINS":
+        _allowed_domains = None
+
+
+def parse_host(url):
+    """Функция выделяет имя хоста из ссылки, ссылка без схемы допускается.
+    Возвращает None, если ссылка не корректна."""
+    match = URL_RE.match(url)
+    if match is None:
+        return None
+    host = match["host"]
+    if host[0] in ".-" or ".." in host:
+        return None
+    return host.lower()
+
+
+@lru_cache(maxsize=4096)
+def is_allowed_host(host, allowed_domains):
+    """Функция проверяет, совпадает ли хост или один из его родительских доменов
+    с разрешенным доменом: www.youtube.com разрешен для youtube.com,
+    а youtube.com.example.org и notyoutube.com - нет.
+    Результат кешируется по хосту и множеству доменов."""
+    if host in allowed_domains:
+        return True
+    position = host.find(".")
+    while position != -1:
+        position += 1
+        if host[position:] in allowed_domains:
+            return True
+        position = host.find(".", position)
+    return False
+
+
+@lru_cache(maxsize=8)
+def forbidden_domain_message(allowed_domains):
+    """Функция формирует текст ошибки со списком разрешенных доменов."""
+    return FORBIDDEN_DOMAIN_MESSAGE.format(domains=", ".join(sorted(allowed_domains)))
+
+
+def check_video_url(url, allowed_domains=None):
+    """Функция проверяет ссылку на видео и возвращает текст ошибки
+    или None, если ссылка допустима."""
+    if allowed_domains is None:
+        allowed_domains = get_allowed_domains()
+    host = parse_host(url)
+    if host is None:
+        return INVALID_URL_MESSAGE
+    if not is_allowed_host(host, allowed_domains):
+        return forbidden_domain_message(allowed_domains)
+    return None
+
+
+def validate_video_urls(urls):
+    """Функция пакетной проверки ссылок для массового импорта уроков:
+    множество доменов получается один раз на пакет.
+    Возвращает словарь {позиция ссылки: текст ошибки} для недопустимых ссылок."""
+    allowed_domains = get_allowed_domains()
+    errors = {}
+    for index, url in enumerate(urls):
+        if url:
+            error = check_video_url(url, allowed_domains)
+            if error:
+                errors[index] = error
+    return errors
+
 
 class URLValidator:
     """Класс для валидации ссылок на курс."""
@@ -13,13 +113,12 @@ class URLValidator:
         return [self.field]
 
     def __call__(self, value):
-        """Метод для получения и проверки указанных данных поля ссылки на видео у объекта модели "Урок"."""
-
-        reg = re.compile("^(https?:)?([\w-]{1,32}\.[\w-]{1,32})[^\s@]*$")
-        tmp_val = dict(value).get(self.field)
-        if not value or value is None or not bool(reg.match(tmp_val)):
-            raise ValidationError("Ссылка не корректна. Не корректный формат ссылки.")
-        elif "youtube.com" not in tmp_val:
-            raise ValidationError(
-                "Ссылка на видео разрешена только с сайта youtube.com."
-            )
+        """Метод для получения и проверки указанных данных поля ссылки на видео у объекта модели "Урок".
+        Пустая или не переданная ссылка (частичное обновление) не проверяется."""
+
+        url = dict(value).get(self.field)
+        if not url:
+            return
+        error = check_video_url(url)
+        if error:
+            raise ValidationError(error)
@@ -1,15 +1,19 @@
-from datetime import timedelta
-from django.utils import timezone
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Prefetch
 from django.utils.decorators import method_decorator
 from drf_spectacular.utils import extend_schema
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, viewsets, status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from users.permissions import IsModerator, IsOwner
-from .paginators import LMSPagination
+from users.roles import is_moderator
+from .caching import CachedResponseMixin
+from .paginators import KeysetPaginationMixin, LMSPagination
 from .models import Course, Lesson
 from .serializers import CourseSerializer, LessonSerializer, DocNoPermissionSerializer
-from users.tasks import send_course_update, test_add
+from users.models import Subscription
+from users.tasks import schedule_course_update
 
 
 @method_decorator(
@@ -18,13 +22,28 @@ from users.tasks import send_course_update, test_add
         operation_description="description from swagger_auto_schema via method_decorator"
     ),
 )
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(CachedResponseMixin, KeysetPaginationMixin, viewsets.ModelViewSet):
     """Контроллер-вьюсет для CRUD
     с правами для работы модераторов, немодераторов или владельцев курсов, лекций"""
 
     serializer_class = CourseSerializer
     queryset = Course.objects.all()
     pagination_class = LMSPagination
+    cursor_ordering = "id"
+
+    def get_cache_generations(self):
+        """Метод возвращает версии данных для кеширования ответов по курсам."""
+        if self.action == "retrieve":
+            return [f"course:{self.kwargs[self.lookup_field]}"]
+        return ["courses"]
+
+    def list(self, request, *args, **kwargs):
+        """Метод вывода списка курсов с кешированием ответа."""
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Метод вывода курса с кешированием ответа."""
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
 
     def get_permissions(self):
         """Метод разграничения разрешений на доступ к эндпоитам в соответствии с запросом."""
@@ -45,26 +64,31 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     def perform_update(self, serializer):
         """Метод обновления курса.
-        Уведомление об обновлении отправляется только в том случае,
-         если курс не обновлялся более четырех часов"""
+        Уведомление подписчикам отправляется одно на серию правок курса и его уроков,
+        после окна тишины COURSE_UPDATE_QUIET_WINDOW."""
 
         course = serializer.save()
-        if course.updated_at:
-            time_difference = timezone.now() - course.updated_at
-            if time_difference > timedelta(hours=4):
-                send_course_update.delay(course)
-                test_add.delay()
-
-        else:
-            send_course_update.delay(course)
-        course.updated_at = timezone.now()
-        course.save()
+        schedule_course_update(course.pk)
 
     def get_queryset(self):
-        """Метод для изменения запроса к базе данных по объектам модели "Курса"."""
-        if self.request.user.groups.filter(name="moderators").exists():
-            return Course.objects.all()
-        return Course.objects.filter(owner=self.request.user)
+        """Метод для изменения запроса к базе данных по объектам модели "Курса".
+        Подписка текущего пользователя вычисляется в том же запросе,
+        уроки подгружаются через prefetch_related."""
+        user = self.request.user
+        queryset = (
+            Course.objects.annotate(
+                user_subscribed=Exists(
+                    Subscription.objects.filter(owner=user, course=OuterRef("pk"))
+                ),
+            )
+            .prefetch_related(
+                Prefetch("lessons", queryset=Lesson.objects.order_by("id"))
+            )
+            .order_by("id")
+        )
+        if is_moderator(user):
+            return queryset
+        return queryset.filter(owner=user)
 
 
 @extend_schema(
@@ -82,32 +106,120 @@ class LessonCreateAPIView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         """Метод для присваивания лекции владельцу."""
-        lesson = serializer.save(owner=self.request.user)
-        lesson.save()
+        serializer.save(owner=self.request.user)
+
+
+@extend_schema(
+    request=LessonSerializer(many=True),
+    responses={
+        status.HTTP_200_OK: LessonSerializer(many=True),
+        status.HTTP_201_CREATED: LessonSerializer(many=True),
+        status.HTTP_403_FORBIDDEN: DocNoPermissionSerializer,
+    },
+)
+class LessonBulkAPIView(generics.GenericAPIView):
+    """Контроллер массового создания (POST) и изменения (PATCH) лекций.
+    Список проверяется целиком и записывается одним bulk_create/bulk_update
+    в одной транзакции, подписчики каждого затронутого курса получают
+    одно уведомление после окна тишины."""
+
+    serializer_class = LessonSerializer
 
+    def get_permissions(self):
+        """Метод разграничения разрешений: создавать лекции могут немодераторы,
+        изменять - владельцы лекций или модераторы."""
+        if self.request.method == "POST":
+            self.permission_classes = [IsAuthenticated & ~IsModerator]
+        else:
+            self.permission_classes = [IsAuthenticated]
+        return super().get_permissions()
 
-class LessonListAPIView(generics.ListAPIView):
+    def get_queryset(self):
+        """Метод возвращает лекции, доступные пользователю для изменения."""
+        if is_moderator(self.request.user):
+            return Lesson.objects.order_by("id")
+        return Lesson.objects.filter(owner=self.request.user).order_by("id")
+
+    def get_serializer(self, *args, **kwargs):
+        """Метод возвращает сериализатор списка лекций ограниченной длины."""
+        kwargs.setdefault("many", True)
+        kwargs.setdefault("max_length", settings.LESSONS_BULK_MAX_SIZE)
+        return super().get_serializer(*args, **kwargs)
+
+    @staticmethod
+    def notify_courses(course_ids):
+        """Метод планирует одно уведомление на каждый затронутый курс."""
+        for course_id in set(course_ids) - {None}:
+            schedule_course_update(course_id)
+
+    def post(self, request, *args, **kwargs):
+        """Метод массового создания лекций текущего пользователя."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lessons = serializer.save(owner=request.user)
+        self.notify_courses(lesson.course_id for lesson in lessons)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def patch(self, request, *args, **kwargs):
+        """Метод массового частичного изменения лекций по их "id"."""
+        items = request.data if isinstance(request.data, list) else []
+        lesson_ids = [
+            item["id"]
+            for item in items
+            if isinstance(item, dict) and isinstance(item.get("id"), int)
+        ]
+        lessons = list(self.get_queryset().filter(pk__in=lesson_ids))
+        previous_course_ids = [lesson.course_id for lesson in lessons]
+        serializer = self.get_serializer(lessons, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        lessons = serializer.save()
+        self.notify_courses(
+            [*previous_course_ids, *(lesson.course_id for lesson in lessons)]
+        )
+        return Response(serializer.data)
+
+
+class LessonListAPIView(
+    CachedResponseMixin, KeysetPaginationMixin, generics.ListAPIView
+):
     """Создание контроллера для вывода списка лекций,
     которые могут просматривать владельцы или модераторы"""
 
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated & IsModerator | IsAuthenticated & IsOwner]
     pagination_class = LMSPagination
+    cursor_ordering = "id"
+
+    def get_cache_generations(self):
+        """Метод возвращает версии данных для кеширования списка лекций."""
+        return ["lessons"]
+
+    def list(self, request, *args, **kwargs):
+        """Метод вывода списка лекций с кешированием ответа."""
+        return self.cached_response(super().list, request, *args, **kwargs)
 
     def get_queryset(self):
         """Метод, позволяет получить список лекции владельца или модератора"""
-        if not IsModerator().has_permission(self.request, self):
-            return Lesson.objects.filter(owner=self.request.user)
-        return Lesson.objects.all()
+        if not is_moderator(self.request.user):
+            return Lesson.objects.filter(owner=self.request.user).order_by("id")
+        return Lesson.objects.order_by("id")
 
 
-class LessonRetrieveAPIView(generics.RetrieveAPIView):
+class LessonRetrieveAPIView(CachedResponseMixin, generics.RetrieveAPIView):
     """Класс, позволяет модератору или владельцу получить детали лекции"""
 
     queryset = Lesson.objects.all().order_by("id")
     serializer_class = LessonSerializer
     permission_classes = [IsAuthenticated & IsModerator | IsAuthenticated & IsOwner]
 
+    def get_cache_generations(self):
+        """Метод возвращает версии данных для кеширования лекции."""
+        return [f"lesson:{self.kwargs[self.lookup_field]}"]
+
+    def retrieve(self, request, *args, **kwargs):
+        """Метод вывода лекции с кешированием ответа."""
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
 
 class LessonUpdateAPIView(generics.UpdateAPIView):
     """Класс, позволяет модератору или владельцу редактировать лекцию"""
@@ -120,18 +232,7 @@ class LessonUpdateAPIView(generics.UpdateAPIView):
         """Метод вносит изменение в сериализатор редактирования "Урока"."""
 
         lesson = serializer.save()
-        courses = Course.objects.filter(pk=lesson.course.pk)
-        for course in courses:
-            if lesson.updated_at:
-                time_difference = timezone.now() - lesson.updated_at
-                if time_difference > timedelta(hours=3):
-                    send_course_update.delay(course.pk)
-            else:
-                send_course_update.delay(course.pk)
-
-        lesson.updated_at = timezone.now()
-        courses.updated_at = timezone.now()
-        lesson.save()
+        schedule_course_update(lesson.course_id)
 
 
 class LessonDestroyAPIView(generics.DestroyAPIView):
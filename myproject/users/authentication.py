@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .roles import ROLES_ATTR, roles_cache_key
+
+# Поля пользователя в закешированном снимке, остальные поля загружаются по обращению
+SNAPSHOT_FIELDS = (
+    "id",
+    "email",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+)
+# Поля снимка в порядке полей модели, как их ожидает User.from_db
+SNAPSHOT_ATTNAMES = tuple(
+    field.attname
+    for field in User._meta.concrete_fields
+    if field.attname in SNAPSHOT_FIELDS
+)
+# Версия формата снимка: меняется при изменении SNAPSHOT_FIELDS
+SNAPSHOT_VERSION = 1
+
+
+def user_snapshot_key(user_id):
+    """Функция формирования ключа снимка пользователя для аутентификации."""
+
+    return f"users:auth:v{SNAPSHOT_VERSION}:{user_id}"
+
+
+def invalidate_user_snapshots(user_ids):
+    """Функция сброса закешированных снимков пользователей."""
+
+    cache.delete_many([user_snapshot_key(user_id) for user_id in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """Аутентификация по JWT с кешированием пользователя.
+    Снимок основных полей пользователя и его роли читаются из кеша одним
+    обращением, поэтому запрос с валидным токеном не обращается к базе данных
+    ни за пользователем, ни за его группами. Снимок хранится
+    USER_AUTH_CACHE_TIMEOUT секунд и сбрасывается при сохранении пользователя
+    и блокировке неактивных пользователей."""
+
+    def get_user(self, validated_token):
+        """Метод возвращает пользователя токена из кеша или из базы данных."""
+
+        timeout = settings.USER_AUTH_CACHE_TIMEOUT
+        if not timeout or api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        snapshot_key = user_snapshot_key(user_id)
+        cached = cache.get_many([snapshot_key, roles_cache_key(user_id)])
+        values = cached.get(snapshot_key)
+        if values is not None:
+            user = User.from_db(User.objects.db, SNAPSHOT_ATTNAMES, values)
+        else:
+            try:
+                user = User.objects.only(*SNAPSHOT_FIELDS).get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except User.DoesNotExist as e:
+                raise AuthenticationFailed(
+                    _("User not found"), code="user_not_found"
+                ) from e
+            cache.set(
+                snapshot_key,
+                tuple(getattr(user, field) for field in SNAPSHOT_ATTNAMES),
+                timeout,
+            )
+
+        roles = cached.get(roles_cache_key(user_id))
+        if roles is not None:
+            setattr(user, ROLES_ATTR, roles)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,25 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку вместо хранения."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(fields, rows):
+    """Генератор строк CSV: заголовок из fields, затем по строке на запись rows."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(fields, rows):
+    """Генератор строк NDJSON: по JSON-объекту с ключами fields на запись rows."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + "\n"
@@ -0,0 +1,15 @@
+from django_filters import rest_framework as filters
+
+from .models import Payment
+
+
+class PaymentFilter(filters.FilterSet):
+    """Фильтр платежей по пользователю, оплаченному курсу или уроку,
+    способу оплаты, статусу и диапазону дат платежа."""
+
+    date_from = filters.IsoDateTimeFilter(field_name="payment_date", lookup_expr="gte")
+    date_to = filters.IsoDateTimeFilter(field_name="payment_date", lookup_expr="lte")
+
+    class Meta:
+        model = Payment
+        fields = ("user", "paid_course", "paid_lesson", "payment_type", "status")
@@ -0,0 +1,100 @@
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import Case, DateTimeField, Value, When
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import User
+
+BUFFER_KEY = "users:last_login"
+
+
+class RedisLastLoginBuffer:
+    """Буфер времени входа в хеше Redis {id пользователя: время входа},
+    общий для всех процессов приложения."""
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def record(self, user_id, timestamp):
+        """Метод запоминает время последнего входа пользователя."""
+        self.client.hset(BUFFER_KEY, user_id, timestamp)
+
+    def drain(self):
+        """Метод забирает накопленные записи: хеш атомарно переименовывается,
+        поэтому входы во время выгрузки попадают уже в новый хеш."""
+        flushing_key = f"{BUFFER_KEY}:flushing:{uuid.uuid4().hex}"
+        try:
+            self.client.rename(BUFFER_KEY, flushing_key)
+        except redis.ResponseError:
+            return {}
+        pipeline = self.client.pipeline()
+        pipeline.hgetall(flushing_key)
+        pipeline.delete(flushing_key)
+        entries, _ = pipeline.execute()
+        return {int(user_id): float(value) for user_id, value in entries.items()}
+
+
+_buffer = None
+
+
+def get_last_login_buffer():
+    """Функция возвращает общий буфер времени входа в Redis, если задан
+    LAST_LOGIN_BUFFER_URL, иначе None."""
+    global _buffer
+    if _buffer is None and settings.LAST_LOGIN_BUFFER_URL:
+        _buffer = RedisLastLoginBuffer(settings.LAST_LOGIN_BUFFER_URL)
+    return _buffer
+
+
+@receiver(setting_changed)
+def reset_last_login_buffer(setting, **kwargs):
+    """Сбрасывает буфер при изменении настроек в тестах."""
+    global _buffer
+    if setting == "LAST_LOGIN_BUFFER_URL":
+        _buffer = None
+
+
+def record_last_login(user):
+    """Функция запоминает вход пользователя в буфере Redis вместо UPDATE в базе данных.
+    Без общего буфера время входа записывается в базу сразу: буфер в памяти
+    процесса веб-сервера не видят задачи Celery, и он теряется при перезапуске."""
+    now = timezone.now()
+    user.last_login = now
+    buffer = get_last_login_buffer()
+    if buffer is None:
+        User.objects.filter(pk=user.pk).update(last_login=now)
+    else:
+        buffer.record(user.pk, now.timestamp())
+
+
+def flush_last_logins():
+    """Функция записывает накопленное время входа в базу данных: один UPDATE
+    с CASE на каждые LAST_LOGIN_FLUSH_BATCH_SIZE пользователей.
+    Возвращает количество обновленных пользователей."""
+    buffer = get_last_login_buffer()
+    if buffer is None:
+        return 0
+    entries = sorted(buffer.drain().items())
+    size = settings.LAST_LOGIN_FLUSH_BATCH_SIZE
+    updated = 0
+    for start in range(0, len(entries), size):
+        end = start + size
+        batch = entries[start:end]
+        updated += User.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            last_login=Case(
+                *[
+                    When(
+                        pk=pk,
+                        then=Value(datetime.fromtimestamp(ts, tz=dt_timezone.utc)),
+                    )
+                    for pk, ts in batch
+                ],
+                output_field=DateTimeField(),
+            )
+        )
+    return updated
@@ -0,0 +1,70 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.tasks import blocking_users
+
+
+class Command(BaseCommand):
+    """Команда замера времени блокировки неактивных пользователей на синтетических данных.
+    Все созданные данные откатываются после замера."""
+
+    help = "Замеряет время работы blocking_users на синтетических пользователях"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument(
+            "--inactive-share",
+            type=float,
+            default=0.1,
+            help="Доля пользователей, не входивших более 30 дней",
+        )
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def idle_days(self, options):
+        """Метод возвращает случайную давность входа пользователя, дней:
+        более 30 дней для доли inactive_share пользователей."""
+        if random.random() < options["inactive_share"]:
+            return random.randint(31, 365)
+        return random.randint(0, 29)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        total = options["users"]
+        now = timezone.now()
+
+        with transaction.atomic():
+            started = time.monotonic()
+            for offset in range(0, total, options["batch_size"]):
+                size = min(options["batch_size"], total - offset)
+                User.objects.bulk_create(
+                    User(
+                        email=f"bench{offset + number}@example.com",
+                        password="!",
+                        last_login=now - timedelta(days=self.idle_days(options)),
+                    )
+                    for number in range(size)
+                )
+            self.stdout.write(
+                f"Создано пользователей: {total} за {time.monotonic() - started:.2f} с."
+            )
+
+            started = time.monotonic()
+            would_block = blocking_users(dry_run=True)
+            self.stdout.write(
+                f"dry_run: найдено {would_block} за {time.monotonic() - started:.2f} с."
+            )
+
+            started = time.monotonic()
+            blocked = blocking_users()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Заблокировано {blocked} за {time.monotonic() - started:.2f} с."
+                )
+            )
+            transaction.set_rollback(True)
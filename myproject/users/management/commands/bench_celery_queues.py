@@ -0,0 +1,144 @@
+import math
+import time
+from contextlib import ExitStack
+
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from django.core.management.base import BaseCommand
+from kombu import Exchange, Queue
+
+from config.celery import QUEUE_WORKERS, TASK_QUEUES
+
+# Имитация времени ожидания сети одной задачей очереди, секунды:
+# SMTP для рассылок, база данных для разбиения рассылок и обслуживания,
+# Stripe для платежей
+QUEUE_DELAYS = {
+    "notifications": 0.2,
+    "course_updates": 0.02,
+    "payments": 0.1,
+    "maintenance": 0.01,
+}
+
+# Отдельное приложение с хранилищем результатов в памяти процесса,
+# очереди те же, что у приложения проекта, брокер задается параметром --broker
+app = Celery("bench_celery_queues", backend="cache+memory://")
+app.conf.task_queues = [
+    Queue(name, Exchange(name), routing_key=name) for name in TASK_QUEUES
+]
+app.conf.broker_transport_options = {"polling_interval": 0.01}
+
+
+@app.task(name="bench.io_task")
+def io_task(delay):
+    """Синтетическая задача, ожидающая ввода-вывода delay секунд."""
+    time.sleep(delay)
+    return delay
+
+
+class Command(BaseCommand):
+    """Команда измерения пропускной способности очередей Celery на брокере в памяти
+    (или на брокере из --broker): для каждой очереди задачи выполняет воркер
+    в режиме solo (как до разделения очередей) и воркер с параметрами очереди
+    из QUEUE_WORKERS. Пулы eventlet и prefork в процессе команды заменяются пулом
+    threads с той же concurrency: задачи только ждут ввода-вывода, поэтому оценка
+    пропускной способности сохраняется.
+    Брокер в памяти не имеет цикла событий и забирает новые задачи только
+    раз в 2 секунды, поэтому для него предвыборка расширяется на всю пачку задач.
+    В конце измеряется ожидание задач обслуживания за рассылками
+    в одном воркере solo и в отдельных воркерах очередей."""
+
+    help = "Измеряет пропускную способность очередей Celery с брокером в памяти"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=100)
+        parser.add_argument("--delay-scale", type=float, default=1.0)
+        parser.add_argument("--queues", nargs="+", default=list(QUEUE_WORKERS))
+        parser.add_argument("--broker", default="memory://")
+
+    def start_worker(self, queues, pool, concurrency, prefetch_multiplier):
+        """Метод запускает воркер в потоке команды для указанных очередей."""
+        if self.in_memory:
+            prefetch_multiplier = max(
+                prefetch_multiplier, math.ceil(self.tasks / concurrency)
+            )
+        return start_worker(
+            app,
+            pool=pool,
+            concurrency=concurrency,
+            perform_ping_check=False,
+            queues=queues,
+            prefetch_multiplier=prefetch_multiplier,
+        )
+
+    def start_queue_worker(self, queue):
+        """Метод запускает воркер очереди с ее параметрами из QUEUE_WORKERS."""
+        profile = QUEUE_WORKERS[queue]
+        return self.start_worker(
+            [queue],
+            "solo" if profile["concurrency"] == 1 else "threads",
+            profile["concurrency"],
+            profile["prefetch_multiplier"],
+        )
+
+    def send(self, queue, delay):
+        """Метод отправляет пачку задач в очередь и возвращает их результаты."""
+        return [
+            io_task.apply_async(args=[delay], queue=queue) for _ in range(self.tasks)
+        ]
+
+    def wait(self, results, started):
+        """Метод ожидает выполнения задач и возвращает прошедшее время, секунды."""
+        for result in results:
+            result.get(timeout=600, interval=0.005)
+        return time.perf_counter() - started
+
+    def delay(self, queue):
+        """Метод возвращает время ожидания одной задачи очереди, секунды."""
+        return QUEUE_DELAYS[queue] * self.delay_scale
+
+    def measure(self, queue, worker):
+        """Метод выполняет пачку задач очереди воркером и возвращает задач в секунду."""
+        with worker:
+            started = time.perf_counter()
+            return self.tasks / self.wait(self.send(queue, self.delay(queue)), started)
+
+    def measure_mixed(self, dedicated):
+        """Метод отправляет рассылки, затем задачи обслуживания и возвращает время
+        выполнения задач обслуживания: в одном воркере solo они ждут рассылки."""
+        with ExitStack() as stack:
+            if dedicated:
+                for queue in ("notifications", "maintenance"):
+                    stack.enter_context(self.start_queue_worker(queue))
+            else:
+                stack.enter_context(
+                    self.start_worker(["notifications", "maintenance"], "solo", 1, 1)
+                )
+            started = time.perf_counter()
+            notifications = self.send("notifications", self.delay("notifications"))
+            maintenance = self.send("maintenance", self.delay("maintenance"))
+            elapsed = self.wait(maintenance, started)
+            self.wait(notifications, started)
+            return elapsed
+
+    def handle(self, *args, **options):
+        app.conf.broker_url = options["broker"]
+        self.in_memory = options["broker"].startswith("memory://")
+        self.tasks = options["tasks"]
+        self.delay_scale = options["delay_scale"]
+
+        for queue in options["queues"]:
+            profile = QUEUE_WORKERS[queue]
+            solo = self.measure(queue, self.start_worker([queue], "solo", 1, 1))
+            tuned = self.measure(queue, self.start_queue_worker(queue))
+            self.stdout.write(
+                f"{queue}: solo {solo:.1f} задач/с, "
+                f"{profile['pool']} x{profile['concurrency']} "
+                f"(prefetch {profile['prefetch_multiplier']}) {tuned:.1f} задач/с"
+            )
+
+        shared = self.measure_mixed(dedicated=False)
+        dedicated = self.measure_mixed(dedicated=True)
+        self.stdout.write(
+            f"Обслуживание за рассылками: общий воркер solo {shared:.2f} с, "
+            f"отдельные воркеры очередей {dedicated:.2f} с"
+        )
@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from users.models import Payment
+
+# Сортировка платежей по умолчанию до перехода на индекс (payment_date, id)
+LEGACY_ORDERING = (
+    "payment_date",
+    "user",
+    "amount",
+    "paid_course",
+    "paid_lesson",
+    "payment_type",
+)
+
+
+class Command(BaseCommand):
+    """Команда сравнения задержки выборки списка платежей со старой сортировкой
+    по шести полям и с сортировкой по индексу (-payment_date, -id).
+    Все созданные данные откатываются после замера."""
+
+    help = "Сравнивает задержку списка платежей со старой и новой сортировкой"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payments", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def measure(self, title, queryset, repeat):
+        """Метод выполняет запрос repeat раз и выводит медиану задержки."""
+        timings = []
+        for _ in range(repeat):
+            started = time.monotonic()
+            list(queryset.all())
+            timings.append(time.monotonic() - started)
+        self.stdout.write(f"{title}: {statistics.median(timings) * 1000:.1f} мс")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        total = options["payments"]
+        page_size = options["page_size"]
+        now = timezone.now()
+
+        with transaction.atomic():
+            started = time.monotonic()
+            users = User.objects.bulk_create(
+                User(email=f"bench{number}@example.com", password="!")
+                for number in range(options["users"])
+            )
+            for offset in range(0, total, options["batch_size"]):
+                size = min(options["batch_size"], total - offset)
+                Payment.objects.bulk_create(
+                    Payment(
+                        user=random.choice(users),
+                        amount=random.randint(100, 10_000),
+                        payment_date=now - timedelta(minutes=random.randint(0, 10**6)),
+                    )
+                    for _ in range(size)
+                )
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            self.stdout.write(
+                f"Создано платежей: {total} за {time.monotonic() - started:.2f} с."
+            )
+
+            repeat = options["repeat"]
+            legacy = Payment.objects.order_by(*LEGACY_ORDERING)
+            current = Payment.objects.order_by("-payment_date", "-id")
+            self.measure(
+                f"Старая сортировка, первые {page_size}", legacy[:page_size], repeat
+            )
+            self.measure(
+                f"Новая сортировка, первые {page_size}", current[:page_size], repeat
+            )
+
+            middle = current.all()[total // 2]
+            keyset = current.filter(payment_date__lte=middle.payment_date).exclude(
+                payment_date=middle.payment_date, id__gt=middle.id
+            )
+            self.measure(
+                f"Новая сортировка, курсор с середины списка, {page_size}",
+                keyset[:page_size],
+                repeat,
+            )
+
+            user = random.choice(users)
+            self.measure(
+                f"История пользователя, старая сортировка, первые {page_size}",
+                legacy.filter(user=user)[:page_size],
+                repeat,
+            )
+            self.measure(
+                f"История пользователя, новая сортировка, первые {page_size}",
+                current.filter(user=user)[:page_size],
+                repeat,
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,42 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand
+
+from config.celery import QUEUE_WORKERS
+
+
+class Command(BaseCommand):
+    """Команда запуска воркера Celery для одной очереди с параметрами пула,
+    concurrency и предвыборки из QUEUE_WORKERS в config/celery.py.
+    Процесс заменяется на celery, поэтому пул eventlet, указанный в командной
+    строке, подключается до импорта остальных модулей."""
+
+    help = "Запускает воркер Celery для очереди с параметрами из QUEUE_WORKERS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("queue", choices=list(QUEUE_WORKERS))
+        parser.add_argument("--loglevel", default="info")
+
+    def handle(self, *args, **options):
+        queue = options["queue"]
+        profile = QUEUE_WORKERS[queue]
+        argv = [
+            sys.executable,
+            "-m",
+            "celery",
+            "-A",
+            "config.celery",
+            "worker",
+            "-Q",
+            queue,
+            "-n",
+            f"{queue}@%h",
+            f"--loglevel={options['loglevel']}",
+            f"--pool={profile['pool']}",
+            f"--concurrency={profile['concurrency']}",
+            f"--prefetch-multiplier={profile['prefetch_multiplier']}",
+        ]
+        self.stdout.write(" ".join(argv[1:]))
+        self.stdout.flush()
+        os.execv(sys.executable, argv)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edu_materials", "0004_keyset_pagination_indexes"),
+        ("users", "0002_alter_user_is_active_alter_user_is_staff_payment_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["payment_date", "id"], name="payment_date_id_idx"
+            ),
+        ),
+    ]
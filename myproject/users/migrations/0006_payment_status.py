@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+def mark_existing_sessions_open(apps, schema_editor):
+    """Платежи с уже созданной сессией Stripe переводятся в статус ожидания оплаты."""
+
+    Payment = apps.get_model("users", "Payment")
+    Payment.objects.filter(session_id__isnull=False).update(status="open")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_stripe_product_price"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Ожидает создания сессии оплаты"),
+                    ("open", "Ожидает оплаты"),
+                    ("paid", "Оплачен"),
+                    ("expired", "Сессия оплаты истекла"),
+                    ("failed", "Ошибка создания сессии оплаты"),
+                ],
+                default="pending",
+                max_length=20,
+                verbose_name="Статус платежа",
+            ),
+        ),
+        migrations.RunPython(mark_existing_sessions_open, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:44
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def delete_duplicate_subscriptions(apps, schema_editor):
+    """Удаляет повторные подписки пользователя на один курс, оставляя самую раннюю,
+    и уменьшает счетчики подписчиков курсов на число удаленных подписок."""
+
+    Subscription = apps.get_model("users", "Subscription")
+    Course = apps.get_model("edu_materials", "Course")
+    duplicates = (
+        Subscription.objects.order_by()
+        .values("owner", "course")
+        .annotate(first_id=Min("id"), amount=Count("id"))
+        .filter(amount__gt=1)
+    )
+    for duplicate in list(duplicates):
+        Subscription.objects.filter(
+            owner=duplicate["owner"], course=duplicate["course"]
+        ).exclude(pk=duplicate["first_id"]).delete()
+        Course.objects.filter(pk=duplicate["course"]).update(
+            subscribers_count=F("subscribers_count") - (duplicate["amount"] - 1)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("edu_materials", "0005_course_counters"),
+        ("users", "0007_stripe_event"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="subscription",
+            constraint=models.UniqueConstraint(
+                fields=("owner", "course"), name="unique_subscription"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="payment",
+            options={
+                "ordering": ["-payment_date", "-id"],
+                "verbose_name": "Платеж",
+                "verbose_name_plural": "Платежи",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="subscription",
+            options={
+                "ordering": ["created_at", "id"],
+                "verbose_name": "Подписка",
+                "verbose_name_plural": "Подписки",
+            },
+        ),
+    ]
@@ -2,7 +2,8 @@ from datetime import datetime
 
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.dispatch import Signal
 from django.utils import timezone
 
 from edu_materials.models import Course, Lesson
@@ -84,6 +85,11 @@ class User(AbstractUser):
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        indexes = [
+            models.Index(
+                fields=["is_active", "last_login"], name="user_active_last_login_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.email
@@ -97,6 +103,19 @@ class Payment(models.Model):
         ("CASH", "Наличными"),
     ]
 
+    STATUS_PENDING = "pending"
+    STATUS_OPEN = "open"
+    STATUS_PAID = "paid"
+    STATUS_EXPIRED = "expired"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Ожидает создания сессии оплаты"),
+        (STATUS_OPEN, "Ожидает оплаты"),
+        (STATUS_PAID, "Оплачен"),
+        (STATUS_EXPIRED, "Сессия оплаты истекла"),
+        (STATUS_FAILED, "Ошибка создания сессии оплаты"),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -149,6 +168,12 @@ class Payment(models.Model):
     payment_link = models.URLField(
         max_length=400, null=True, blank=True, verbose_name="Ссылка на оплату"
     )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус платежа",
+    )
 
     def __str__(self):
         """Метод для описания  модели платеж."""
@@ -160,16 +185,98 @@ class Payment(models.Model):
 
         verbose_name = "Платеж"
         verbose_name_plural = "Платежи"
-        ordering = [
-            "payment_date",
-            "user",
-            "amount",
-            "paid_course",
-            "paid_lesson",
-            "payment_type",
+        ordering = ["-payment_date", "-id"]
+        indexes = [
+            models.Index(fields=["payment_date", "id"], name="payment_date_id_idx"),
+            models.Index(
+                fields=["user", "payment_date", "id"], name="payment_user_date_idx"
+            ),
+            models.Index(
+                fields=["paid_course", "payment_type"], name="payment_course_type_idx"
+            ),
+            models.Index(
+                fields=["session_id"],
+                name="payment_session_id_idx",
+                condition=models.Q(session_id__isnull=False),
+            ),
         ]
 
 
+# Наибольший идентификатор курса (BigAutoField): большие значения
+# нельзя передать в запросы подписки
+MAX_COURSE_ID = 2**63 - 1
+
+# Сигнал массового изменения подписок, выполненного без сигналов post_save/post_delete.
+# Аргументы: subscribed и unsubscribed - идентификаторы курсов.
+subscriptions_changed = Signal()
+
+
+class SubscriptionManager(models.Manager):
+    """Менеджер подписок с атомарной подпиской и отпиской одним SQL-запросом."""
+
+    def _execute_returning_courses(self, sql, params):
+        """Метод выполняет запрос и возвращает идентификаторы курсов из RETURNING."""
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def subscribe(self, owner_id, course_ids):
+        """Метод подписывает пользователя на существующие курсы одним
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING и возвращает курсы,
+        подписка на которые была добавлена."""
+        course_ids = list(course_ids)
+        if not course_ids:
+            return []
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        meta = self.model._meta
+        owner = qn(meta.get_field("owner").column)
+        course = qn(meta.get_field("course").column)
+        created_at_field = meta.get_field("created_at")
+        created_at = created_at_field.get_db_prep_value(
+            timezone.now(), connection=connection
+        )
+        placeholders = ", ".join(["%s"] * len(course_ids))
+        sql = (
+            f"INSERT INTO {qn(meta.db_table)} "
+            f"({owner}, {course}, {qn(created_at_field.column)}) "
+            f"SELECT %s, {qn('id')}, %s FROM {qn(Course._meta.db_table)} "
+            f"WHERE {qn('id')} IN ({placeholders}) "
+            f"ON CONFLICT ({owner}, {course}) DO NOTHING RETURNING {course}"
+        )
+        subscribed = self._execute_returning_courses(
+            sql, [owner_id, created_at, *course_ids]
+        )
+        if subscribed:
+            subscriptions_changed.send(
+                sender=self.model, subscribed=subscribed, unsubscribed=[]
+            )
+        return subscribed
+
+    def unsubscribe(self, owner_id, course_ids):
+        """Метод отписывает пользователя от курсов одним DELETE ... RETURNING
+        и возвращает курсы, подписка на которые была удалена."""
+        course_ids = list(course_ids)
+        if not course_ids:
+            return []
+        qn = connections[self.db].ops.quote_name
+        meta = self.model._meta
+        owner = qn(meta.get_field("owner").column)
+        course = qn(meta.get_field("course").column)
+        placeholders = ", ".join(["%s"] * len(course_ids))
+        sql = (
+            f"DELETE FROM {qn(meta.db_table)} "
+            f"WHERE {owner} = %s AND {course} IN ({placeholders}) "
+            f"RETURNING {course}"
+        )
+        unsubscribed = self._execute_returning_courses(sql, [owner_id, *course_ids])
+        if unsubscribed:
+            subscriptions_changed.send(
+                sender=self.model, subscribed=[], unsubscribed=unsubscribed
+            )
+        return unsubscribed
+
+
 class Subscription(models.Model):
     """Класс модели подписка."""
 
@@ -187,6 +294,8 @@ class Subscription(models.Model):
         auto_now_add=True, verbose_name="Дата начала подписки"
     )
 
+    objects = SubscriptionManager()
+
     def __str__(self):
         """Метод для описания модели подписка"""
 
@@ -197,4 +306,119 @@ class Subscription(models.Model):
 
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
-        ordering = ["created_at", "owner", "course"]
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(
+                fields=["owner", "created_at", "id"],
+                name="subscription_owner_created_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "course"], name="unique_subscription"
+            ),
+        ]
+
+
+class StripeProduct(models.Model):
+    """Класс модели соответствия курса или урока продукту в Stripe."""
+
+    course = models.OneToOneField(
+        Course,
+        on_delete=models.CASCADE,
+        related_name="stripe_product",
+        verbose_name="Курс",
+        blank=True,
+        null=True,
+    )
+    lesson = models.OneToOneField(
+        Lesson,
+        on_delete=models.CASCADE,
+        related_name="stripe_product",
+        verbose_name="Урок",
+        blank=True,
+        null=True,
+    )
+    product_id = models.CharField(
+        max_length=255, unique=True, verbose_name="ID продукта в Stripe"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    def __str__(self):
+        """Метод для описания модели продукта Stripe."""
+
+        return f"{self.course or self.lesson} ({self.product_id})"
+
+    class Meta:
+        """Класс для изменения поведения полей модели продукта Stripe."""
+
+        verbose_name = "Продукт Stripe"
+        verbose_name_plural = "Продукты Stripe"
+
+
+class StripePrice(models.Model):
+    """Класс модели цены продукта в Stripe."""
+
+    product = models.ForeignKey(
+        StripeProduct,
+        on_delete=models.CASCADE,
+        related_name="prices",
+        verbose_name="Продукт Stripe",
+    )
+    unit_amount = models.PositiveBigIntegerField(
+        verbose_name="Сумма в минимальных единицах валюты"
+    )
+    currency = models.CharField(max_length=3, verbose_name="Валюта")
+    price_id = models.CharField(
+        max_length=255, unique=True, verbose_name="ID цены в Stripe"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    def __str__(self):
+        """Метод для описания модели цены Stripe."""
+
+        return f"{self.unit_amount} {self.currency} ({self.price_id})"
+
+    class Meta:
+        """Класс для изменения поведения полей модели цены Stripe."""
+
+        verbose_name = "Цена Stripe"
+        verbose_name_plural = "Цены Stripe"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "unit_amount", "currency"],
+                name="unique_stripe_price",
+            ),
+        ]
+
+
+class StripeEvent(models.Model):
+    """Класс модели события Stripe, полученного через вебхук."""
+
+    event_id = models.CharField(
+        max_length=255, unique=True, verbose_name="ID события в Stripe"
+    )
+    type = models.CharField(max_length=100, verbose_name="Тип события")
+    payload = models.JSONField(verbose_name="Объект события")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата получения")
+    processed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Дата обработки"
+    )
+
+    def __str__(self):
+        """Метод для описания модели события Stripe."""
+
+        return f"{self.type} ({self.event_id})"
+
+    class Meta:
+        """Класс для изменения поведения полей модели события Stripe."""
+
+        verbose_name = "Событие Stripe"
+        verbose_name_plural = "События Stripe"
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="stripe_event_unprocessed_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
@@ -1,11 +1,13 @@
 from rest_framework.permissions import BasePermission
 
+from .roles import is_moderator
+
 
 class IsModerator(BasePermission):
     """Модель для получения прав группы модераторов."""
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name="moderators").exists()
+        return is_moderator(request.user)
 
 
 class IsOwner(BasePermission):
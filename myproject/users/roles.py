@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import cache
+
+MODERATORS_GROUP = "moderators"
+
+ROLES_ATTR = "_cached_roles"
+
+
+def roles_cache_key(user_id):
+    """Функция формирования ключа кеша ролей пользователя."""
+
+    return f"users:roles:{user_id}"
+
+
+def get_user_roles(user):
+    """Функция возвращает множество названий групп пользователя.
+    Роли вычисляются один раз на объект пользователя (то есть на запрос)
+    и дополнительно кешируются в общем кеше на USER_ROLES_CACHE_TIMEOUT секунд."""
+
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, ROLES_ATTR, None)
+    if roles is not None:
+        return roles
+
+    timeout = settings.USER_ROLES_CACHE_TIMEOUT
+    if timeout:
+        roles = cache.get(roles_cache_key(user.pk))
+    if roles is None:
+        roles = frozenset(user.groups.values_list("name", flat=True))
+        if timeout:
+            cache.set(roles_cache_key(user.pk), roles, timeout)
+    setattr(user, ROLES_ATTR, roles)
+    return roles
+
+
+def is_moderator(user):
+    """Функция проверки принадлежности пользователя к группе модераторов."""
+
+    return MODERATORS_GROUP in get_user_roles(user)
+
+
+def invalidate_user_roles(user_ids):
+    """Функция сброса закешированных ролей пользователей."""
+
+    cache.delete_many([roles_cache_key(user_id) for user_id in user_ids])
@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
-from .models import Payment, User, Subscription
+from rest_framework.reverse import reverse
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from .last_login import record_last_login
+from .models import MAX_COURSE_ID, Payment, User, Subscription
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -8,20 +14,69 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = "__all__"
+        read_only_fields = ("status",)
+
+
+class PaymentStatusSerializer(serializers.ModelSerializer):
+    """Сериализатор статуса платежа."""
+
+    class Meta:
+        model = Payment
+        fields = ("id", "status", "payment_link")
+
+
+class PaymentReportSerializer(serializers.Serializer):
+    """Сериализатор строки отчета по платежам: группа и ее итоги.
+    Поля группировки, не выбранные в запросе, в строку не выводятся."""
+
+    paid_course = serializers.IntegerField(required=False, allow_null=True)
+    paid_lesson = serializers.IntegerField(required=False, allow_null=True)
+    payment_type = serializers.CharField(required=False)
+    period = serializers.DateTimeField(required=False)
+    total = serializers.DecimalField(max_digits=20, decimal_places=2)
+    count = serializers.IntegerField()
+
+    group_fields = ("paid_course", "paid_lesson", "payment_type", "period")
+
+    def __init__(self, *args, **kwargs):
+        """Метод убирает поля группировки, не указанные в context["group_by"]."""
+        super().__init__(*args, **kwargs)
+        group_by = self.context.get("group_by")
+        if group_by is not None:
+            for field in set(self.group_fields) - set(group_by):
+                self.fields.pop(field)
 
 
 class UserSerializer(serializers.ModelSerializer):
     """Создание сериализатора для модели пользователя с вложенным сериализатором платежей,
     видим, какие платежи были у пользователя"""
 
-    payments = PaymentSerializer(many=True, read_only=True)
+    payments = serializers.SerializerMethodField(read_only=True)
+
+    @staticmethod
+    def payments_prefetch():
+        """Метод возвращает предзагрузку последних USER_HISTORY_LIMIT платежей
+        пользователя вместе с оплаченными курсами и уроками."""
+        return Prefetch(
+            "payments",
+            queryset=Payment.objects.select_related(
+                "paid_course", "paid_lesson"
+            ).order_by("-payment_date", "-id")[: settings.USER_HISTORY_LIMIT],
+            to_attr="recent_payments",
+        )
+
+    def get_payments(self, obj):
+        """Метод для вывода последних платежей пользователя."""
+
+        if not hasattr(obj, "recent_payments"):
+            prefetch_related_objects([obj], self.payments_prefetch())
+        return PaymentSerializer(obj.recent_payments, many=True).data
 
     class Meta:
         model = User
         fields = (
             "id",
             "password",
-            "username",
             "email",
             "first_name",
             "last_name",
@@ -39,7 +94,6 @@ class UserBaseSerializer(serializers.ModelSerializer):
         model = User
         fields = (
             "id",
-            "username",
             "email",
             "phone",
             "town",
@@ -47,31 +101,100 @@ class UserBaseSerializer(serializers.ModelSerializer):
         )
 
 
+class PaymentHistorySerializer(serializers.ModelSerializer):
+    """Сериализатор платежа для истории платежей пользователя."""
+
+    class Meta:
+        model = Payment
+        fields = (
+            "id",
+            "payment_date",
+            "amount",
+            "payment_type",
+            "status",
+            "paid_course",
+            "paid_lesson",
+        )
+
+
+class SubscriptionHistorySerializer(serializers.ModelSerializer):
+    """Сериализатор подписки для истории подписок пользователя."""
+
+    course_name = serializers.CharField(source="course.name", read_only=True)
+    course_updated = serializers.SerializerMethodField()
+
+    def get_course_updated(self, obj):
+        """Метод проверяет, обновлялся ли курс после оформления подписки.
+        Подписка на удаленный курс (без курса) обновлений не имеет."""
+        if obj.course is None:
+            return False
+        updated_at = obj.course.updated_at
+        return bool(updated_at and obj.created_at < updated_at)
+
+    class Meta:
+        model = Subscription
+        fields = ("id", "course", "course_name", "created_at", "course_updated")
+
+
 class CustomUserSerializer(serializers.ModelSerializer):
-    """Кастомный сериализатор пользователя с выводом информации об истории подписке."""
+    """Кастомный сериализатор пользователя с выводом информации об истории подписке.
+    История платежей и подписок ограничена последними USER_HISTORY_LIMIT записями
+    и содержит ссылку на полный список."""
 
     payment_info = serializers.SerializerMethodField(read_only=True)
     subscriptions = serializers.SerializerMethodField(read_only=True)
 
+    @staticmethod
+    def history_prefetches():
+        """Метод возвращает ограниченные предзагрузки истории платежей и подписок:
+        по одному запросу на каждую историю для всего набора пользователей."""
+        limit = settings.USER_HISTORY_LIMIT + 1
+        return (
+            Prefetch(
+                "payments",
+                queryset=Payment.objects.order_by("-payment_date", "-id")[:limit],
+                to_attr="recent_payments",
+            ),
+            Prefetch(
+                "subscription_set",
+                queryset=Subscription.objects.select_related("course").order_by(
+                    "-created_at", "-id"
+                )[:limit],
+                to_attr="recent_subscriptions",
+            ),
+        )
+
+    def history(self, items, serializer_class, url):
+        """Метод формирует страницу истории: записи, признак наличия
+        более старых записей и ссылку на полный список."""
+        limit = settings.USER_HISTORY_LIMIT
+        return {
+            "results": serializer_class(items[:limit], many=True).data,
+            "has_more": len(items) > limit,
+            "url": reverse(url, request=self.context.get("request")),
+        }
+
     def get_payment_info(self, obj):
         """Метод для вывода информации об истории платежей пользователя."""
 
-        list_info = [
-            f"{p.created_at}-({p.amount}, способ оплаты: {p.payment_type}),"
-            for p in Payment.objects.filter(owner=obj).order_by("created_at")
-        ]
-        pay_info = ", ".join(list_info)
-        return pay_info
+        if not hasattr(obj, "recent_payments"):
+            prefetch_related_objects([obj], self.history_prefetches()[0])
+        history = self.history(
+            obj.recent_payments, PaymentHistorySerializer, "users:payments"
+        )
+        history["url"] = f"{history['url']}?user={obj.pk}"
+        return history
 
     def get_subscriptions(self, obj):
         """Метод для вывода информации об обновлениях подписки"""
 
-        list_update = [
-            f'{s.course}-(pk={s.course.pk}{bool(s.created_at < s.course.updated_at) * "Курс обновлен!"}),'
-            for s in Subscription.objects.filter(owner=obj).order_by("created_at")
-        ]
-        subscriptions_updated = ", ".join(list_update)
-        return subscriptions_updated
+        if not hasattr(obj, "recent_subscriptions"):
+            prefetch_related_objects([obj], self.history_prefetches()[1])
+        return self.history(
+            obj.recent_subscriptions,
+            SubscriptionHistorySerializer,
+            "users:subscription",
+        )
 
     class Meta:
         """Класс для изменения поведения полей сериализатора модели "Пользователь"."""
@@ -88,3 +211,39 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
         model = Subscription
         fields = "__all__"
+
+
+class SubscriptionBulkSerializer(serializers.Serializer):
+    """Сериализатор списков курсов для массовой подписки и отписки."""
+
+    subscribe = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_COURSE_ID),
+        required=False,
+        default=list,
+        max_length=1000,
+    )
+    unsubscribe = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_COURSE_ID),
+        required=False,
+        default=list,
+        max_length=1000,
+    )
+
+    def validate(self, attrs):
+        """Метод проверяет, что курс не указан одновременно в обоих списках."""
+        if set(attrs["subscribe"]) & set(attrs["unsubscribe"]):
+            raise serializers.ValidationError(
+                "Курс не может быть одновременно в списках подписки и отписки."
+            )
+        return attrs
+
+
+class BufferedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Сериализатор получения пары токенов, который запоминает время входа
+    в буфере вместо UPDATE пользователя на каждый вход."""
+
+    def validate(self, attrs):
+        """Метод выдает токены и записывает вход пользователя в буфер."""
+        data = super().validate(attrs)
+        record_last_login(self.user)
+        return data
@@ -1,51 +1,127 @@
+from django.db import IntegrityError, transaction
 from config.settings import STRIPE_API_KEY
 import stripe
 
+from edu_materials.caching import bump_generations
+from .models import Payment, StripePrice, StripeProduct
 
-api_key = STRIPE_API_KEY
+stripe.api_key = STRIPE_API_KEY
+
+CURRENCY = "rub"
 
 
 def create_product(payment):
-    """Функция создания продукта в Stripe."""
-
-    stripe_products_list = stripe.Product.list()
-    print(stripe_products_list)
-    for product in stripe_products_list:
-        if payment.paid_course.name != product.name and payment.paid_lesson is None:
-            paid_product = payment.paid_course.name
-            stripe_product = stripe.Product.create(name=f"{paid_product}")
-        elif payment.paid_lesson.name != product.name and payment.paid_lesson.name is not None:
-            paid_product = payment.paid_lesson.name
-            stripe_product = stripe.Product.create(name=f"{paid_product}")
-        else:
-            stripe_product = product
-        return stripe_product["id"]
+    """Функция получения продукта в Stripe для оплаченного курса или урока.
+    Продукт создается в Stripe только при первой оплате, далее берется из базы."""
+
+    if payment.paid_lesson_id:
+        lookup = {"lesson_id": payment.paid_lesson_id}
+        name = payment.paid_lesson.name
+        idempotency_key = f"product-lesson-{payment.paid_lesson_id}"
+    else:
+        lookup = {"course_id": payment.paid_course_id}
+        name = payment.paid_course.name
+        idempotency_key = f"product-course-{payment.paid_course_id}"
+
+    product_id = (
+        StripeProduct.objects.filter(**lookup)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    if product_id:
+        return product_id
+
+    stripe_product = stripe.Product.create(name=name, idempotency_key=idempotency_key)
+    try:
+        with transaction.atomic():
+            StripeProduct.objects.create(product_id=stripe_product["id"], **lookup)
+    except IntegrityError:
+        # Продукт уже сохранен параллельной задачей - берется сохраненный
+        return StripeProduct.objects.values_list("product_id", flat=True).get(**lookup)
+    return stripe_product["id"]
 
 
 def create_price(payment, stripe_product_id):
-    """Функция создания цены в Stripe."""
+    """Функция получения цены в Stripe для продукта и суммы платежа.
+    Цена создается в Stripe только для новой пары (сумма, валюта)."""
+
+    unit_amount = int(payment.amount * 100)
+    price_id = (
+        StripePrice.objects.filter(
+            product__product_id=stripe_product_id,
+            unit_amount=unit_amount,
+            currency=CURRENCY,
+        )
+        .values_list("price_id", flat=True)
+        .first()
+    )
+    if price_id:
+        return price_id
 
-    return stripe.Price.create(
-        currency="rub",
-        unit_amount=int(payment.payment_amount * 100),
+    stripe_price = stripe.Price.create(
+        currency=CURRENCY,
+        unit_amount=unit_amount,
         product=stripe_product_id,
+        idempotency_key=f"price-{stripe_product_id}-{unit_amount}-{CURRENCY}",
     )
+    product = StripeProduct.objects.filter(product_id=stripe_product_id).first()
+    if product:
+        try:
+            with transaction.atomic():
+                StripePrice.objects.create(
+                    product=product,
+                    unit_amount=unit_amount,
+                    currency=CURRENCY,
+                    price_id=stripe_price["id"],
+                )
+        except IntegrityError:
+            # Цена уже сохранена параллельной задачей - берется сохраненная
+            return StripePrice.objects.values_list("price_id", flat=True).get(
+                product=product, unit_amount=unit_amount, currency=CURRENCY
+            )
+    return stripe_price["id"]
 
 
-def create_session(price):
+def create_session(price_id, idempotency_key=None):
     """Функция создания сессии платежа в Stripe."""
 
     session = stripe.checkout.Session.create(
         success_url="http://127.0.0.1:8000/",
-        line_items=[{"price": price.get("id"), "quantity": 1}],
+        line_items=[{"price": price_id, "quantity": 1}],
         mode="payment",
+        idempotency_key=idempotency_key,
     )
     return session.get("id"), session.get("url")
 
 
-def checkout_stripe_session(session_id):
-    """Проверки статуса сессии платежа в Stripe."""
+def create_checkout(payment):
+    """Функция создания сессии оплаты в Stripe для платежа
+    и сохранения идентификатора сессии и ссылки на оплату."""
+
+    product_id = create_product(payment)
+    price_id = create_price(payment, product_id)
+    session_id, session_url = create_session(
+        price_id, idempotency_key=f"session-payment-{payment.pk}"
+    )
+    Payment.objects.filter(pk=payment.pk).update(
+        session_id=session_id, payment_link=session_url, status=Payment.STATUS_OPEN
+    )
+    bump_generations("payments")
+    payment.session_id = session_id
+    payment.payment_link = session_url
+    payment.status = Payment.STATUS_OPEN
+    return payment
+
+
+def payment_status_from_event(event_type, session):
+    """Функция определяет статус платежа по событию Stripe о сессии оплаты."""
 
-    checkout_session_id = stripe.checkout.Session.retrieve(session_id)
-    if session_id in checkout_session_id.get("url"):
-        return True
+    if event_type == "checkout.session.completed":
+        if session.get("payment_status") == "paid":
+            return Payment.STATUS_PAID
+        return None
+    return {
+        "checkout.session.async_payment_succeeded": Payment.STATUS_PAID,
+        "checkout.session.async_payment_failed": Payment.STATUS_FAILED,
+        "checkout.session.expired": Payment.STATUS_EXPIRED,
+    }.get(event_type)
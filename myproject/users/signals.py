@@ -0,0 +1,50 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from edu_materials.caching import bump_generations_on_commit
+from .authentication import invalidate_user_snapshots
+from .models import Payment, User
+from .roles import ROLES_ATTR, invalidate_user_roles
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def reset_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кеш ролей при изменении состава групп пользователей.
+    Кеш сбрасывается после фиксации транзакции, иначе параллельный запрос
+    успел бы закешировать прежние роли до ее завершения."""
+
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            instance.__dict__.pop(ROLES_ATTR, None)
+            transaction.on_commit(partial(invalidate_user_roles, [instance.pk]))
+        return
+
+    if action == "pre_clear":
+        instance._cleared_user_ids = list(
+            instance.user_set.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        user_ids = instance.__dict__.pop("_cleared_user_ids", [])
+        transaction.on_commit(partial(invalidate_user_roles, user_ids))
+    elif action in ("post_add", "post_remove"):
+        transaction.on_commit(partial(invalidate_user_roles, list(pk_set)))
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_payments_report(sender, **kwargs):
+    """Сбрасывает закешированные отчеты по платежам после фиксации изменения платежа."""
+
+    bump_generations_on_commit("payments")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reset_user_snapshot(sender, instance, **kwargs):
+    """Сбрасывает закешированный для аутентификации снимок пользователя
+    после фиксации транзакции."""
+
+    transaction.on_commit(partial(invalidate_user_snapshots, [instance.pk]))
@@ -1,66 +1,273 @@
 import smtplib
+import time
+import stripe
+from collections import defaultdict
 from datetime import timedelta
+from itertools import islice
 from celery import shared_task
-from django.core.mail import send_mail
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import transaction
 from django.utils import timezone
-from django.http import HttpResponse, BadHeaderError
+from django.http import BadHeaderError
 from config.settings import EMAIL_HOST_USER
+from edu_materials.caching import bump_generations
 from edu_materials.models import Course
-from .models import Subscription, User
+from .authentication import invalidate_user_snapshots
+from . import last_login
+from .models import Payment, StripeEvent, Subscription, User
+from .services import create_checkout, payment_status_from_event
+
+logger = get_task_logger(__name__)
+
+
+def batched(iterable, size):
+    """Разбивает итерируемый объект на списки длиной не более size."""
+
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def course_update_pending_key(course_id):
+    """Ключ признака запланированной рассылки об обновлении курса."""
+
+    return f"users:course_update:pending:{course_id}"
+
+
+def course_update_changed_key(course_id):
+    """Ключ времени последнего изменения курса или его уроков."""
+
+    return f"users:course_update:changed:{course_id}"
+
+
+def schedule_course_update(course_id):
+    """Регистрирует изменение курса для отложенной рассылки подписчикам.
+    Первое изменение ставит задачу flush_course_update через окно тишины,
+    последующие только сдвигают время последнего изменения, поэтому серия правок
+    приводит к одной рассылке."""
+
+    if course_id is None:
+        return False
+    window = settings.COURSE_UPDATE_QUIET_WINDOW
+    timeout = 2 * window + 60
+    cache.set(course_update_changed_key(course_id), time.time(), timeout)
+    if not cache.add(course_update_pending_key(course_id), 1, timeout):
+        cache.touch(course_update_pending_key(course_id), timeout)
+        return False
+    flush_course_update.apply_async(args=[course_id], countdown=window)
+    return True
+
+
+@shared_task
+def flush_course_update(course_id):
+    """Запускает рассылку, если с последнего изменения курса прошло окно тишины,
+    иначе откладывает себя до конца окна."""
+
+    changed_at = cache.get(course_update_changed_key(course_id), 0)
+    remaining = changed_at + settings.COURSE_UPDATE_QUIET_WINDOW - time.time()
+    if remaining > 0:
+        flush_course_update.apply_async(args=[course_id], countdown=remaining)
+        return False
+    cache.delete(course_update_pending_key(course_id))
+    send_course_update.delay(course_id)
+    return True
 
 
 @shared_task
 def send_course_update(course_id):
-    """Отправляет сообщение об обновлении материалов курса тем, кто подписан на этот курс."""
+    """Отправляет сообщение об обновлении материалов курса тем, кто подписан на этот курс.
+    Адреса подписчиков читаются потоком и рассылаются пачками в отдельных подзадачах."""
+
+    course_name = (
+        Course.objects.filter(pk=course_id).values_list("name", flat=True).first()
+    )
+    if course_name is None:
+        return 0
+
+    emails = (
+        Subscription.objects.filter(course_id=course_id)
+        .order_by()
+        .values_list("owner__email", flat=True)
+        .iterator(chunk_size=settings.COURSE_UPDATE_CHUNK_SIZE)
+    )
+    batches = 0
+    for recipient_list in batched(emails, settings.COURSE_UPDATE_BATCH_SIZE):
+        send_course_update_batch.delay(course_name, recipient_list)
+        batches += 1
+    return batches
+
 
-    course = Course.objects.get(id=course_id)
-    subscriptions = Subscription.objects.filter(course=course_id)
-    recipient_list = [subscription.owner.email for subscription in subscriptions]
+@shared_task(bind=True, max_retries=5)
+def send_course_update_batch(self, course_name, recipient_list):
+    """Отправляет пачку писем об обновлении курса через одно SMTP-соединение.
+    При ошибке SMTP повторяет попытку с экспоненциальной задержкой только для
+    адресов, которым письмо еще не отправлено; после исчерпания попыток
+    задача завершается ошибкой."""
 
+    started = time.monotonic()
+    sent = 0
     try:
-        send_mail(
-            subject="В курсе произошли изменения",
-            message=f'В курсе "{course.name}" произошли изменения',
-            from_email=EMAIL_HOST_USER,
-            recipient_list=recipient_list,
-            fail_silently=True,
+        with get_connection() as connection:
+            for email in recipient_list:
+                message = EmailMessage(
+                    subject="В курсе произошли изменения",
+                    body=f'В курсе "{course_name}" произошли изменения',
+                    from_email=EMAIL_HOST_USER,
+                    to=[email],
+                )
+                connection.send_messages([message])
+                sent += 1
+    except (smtplib.SMTPException, OSError) as exc:
+        logger.warning(
+            f'Курс "{course_name}": отправлено {sent} из {len(recipient_list)} писем, '
+            f"ошибка SMTP: {exc}"
+        )
+        raise self.retry(
+            exc=exc,
+            args=[course_name, recipient_list[sent:]],
+            countdown=2**self.request.retries,
         )
-    except smtplib.SMTPException:
-        raise smtplib.SMTPException
+    elapsed = round(time.monotonic() - started, 3)
+    logger.info(
+        f'Курс "{course_name}": отправлено {sent} из {len(recipient_list)} писем за {elapsed} с.'
+    )
+    return {"sent": sent, "elapsed": elapsed}
+
+
+@shared_task(bind=True, max_retries=5)
+def create_checkout_session(self, payment_id):
+    """Создает сессию оплаты в Stripe для платежа в фоне.
+    При ошибках Stripe повторяет попытку с экспоненциальной задержкой,
+    после исчерпания попыток переводит платеж в статус ошибки."""
+
+    payment = (
+        Payment.objects.select_related("paid_course", "paid_lesson")
+        .filter(pk=payment_id, status=Payment.STATUS_PENDING)
+        .first()
+    )
+    if payment is None:
+        return None
+    try:
+        create_checkout(payment)
+    except stripe.StripeError as exc:
+        if self.request.retries >= self.max_retries:
+            Payment.objects.filter(pk=payment_id).update(status=Payment.STATUS_FAILED)
+            raise
+        raise self.retry(exc=exc, countdown=2**self.request.retries)
+    return payment.session_id
 
 
 @shared_task
-def blocking_users():
-    """Блокирует пользователей, которые бездействуют более 30 дней."""
-
-    users = User.objects.filter(is_active=True)
-    today = timezone.now()
-    was_blocked = []  # будем собирать сюда email заблокированных
-    for user in users:
-        if user.last_login:
-            if today - user.last_login > timedelta(days=30):
-                was_blocked.append(user.email)
-                user.is_active = False
-                user.save()
-        return was_blocked
-
-    if was_blocked:
-        recipient_list = [
-            user.email for user in User.objects.filter(groups__name="Администратор")
-        ]
-        try:
-            send_mail(
-                subject="Блокировка неактивных пользователей",
-                message=f"Пользователи: {', '.join(was_blocked)} заблокированы.",
-                from_email=EMAIL_HOST_USER,
-                recipient_list=recipient_list,
-                fail_silently=True,
+def process_stripe_events():
+    """Обрабатывает накопленные события Stripe пачками по STRIPE_EVENTS_BATCH_SIZE:
+    для каждой пачки статусы платежей обновляются одним UPDATE на статус.
+    Оплаченные платежи поздними событиями не изменяются."""
+
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True)
+                .order_by("id")[: settings.STRIPE_EVENTS_BATCH_SIZE]
+            )
+            if not events:
+                break
+
+            statuses = {}
+            for event in events:
+                payment_status = payment_status_from_event(event.type, event.payload)
+                session_id = event.payload.get("id")
+                if not (payment_status and session_id):
+                    continue
+                if statuses.get(session_id) != Payment.STATUS_PAID:
+                    statuses[session_id] = payment_status
+            sessions_by_status = defaultdict(list)
+            for session_id, payment_status in statuses.items():
+                sessions_by_status[payment_status].append(session_id)
+            for payment_status, session_ids in sessions_by_status.items():
+                Payment.objects.filter(session_id__in=session_ids).exclude(
+                    status=Payment.STATUS_PAID
+                ).update(status=payment_status)
+
+            StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                processed_at=timezone.now()
             )
-        except BadHeaderError:
-            return HttpResponse("Обнаружена ошибка")
-        except smtplib.SMTPException:
-            raise smtplib.SMTPException
-        print(f"Пользователи:{', '.join(was_blocked)} заблокированы.")
+        if sessions_by_status:
+            bump_generations("payments")
+        processed += len(events)
+    return processed
+
+
+@shared_task
+def flush_last_logins():
+    """Периодически записывает буфер времени входа пользователей в базу данных."""
+
+    updated = last_login.flush_last_logins()
+    logger.info("Записано время входа %s пользователей", updated)
+    return updated
+
+
+@shared_task
+def blocking_users(dry_run=False):
+    """Блокирует пользователей, которые бездействуют более INACTIVE_USER_DAYS дней.
+    Перед выборкой в базу записывается буфер времени входа.
+    Пользователи выбираются пачками по первичному ключу и блокируются одним UPDATE
+    на пачку, каждая пачка записывается в журнал. Возвращает количество
+    заблокированных пользователей, в режиме dry_run - количество тех,
+    кто был бы заблокирован, без изменения данных."""
+
+    last_login.flush_last_logins()
+    cutoff = timezone.now() - timedelta(days=settings.INACTIVE_USER_DAYS)
+    inactive_users = User.objects.filter(is_active=True, last_login__lt=cutoff)
+    blocked = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            inactive_users.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[: settings.BLOCKING_USERS_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1]
+        if dry_run:
+            updated = len(chunk)
+        else:
+            # Пользователь мог войти после выборки пачки: UPDATE повторяет условия
+            # выборки, в итог попадают только действительно заблокированные
+            updated = inactive_users.filter(pk__in=chunk).update(is_active=False)
+            invalidate_user_snapshots(chunk)
+        blocked += updated
+        logger.info(
+            "%s %s неактивных пользователей с id %s-%s",
+            "Найдено" if dry_run else "Заблокировано",
+            updated,
+            chunk[0],
+            chunk[-1],
+        )
+
+    if dry_run or not blocked:
+        return blocked
+
+    recipient_list = [
+        user.email for user in User.objects.filter(groups__name="Администратор")
+    ]
+    try:
+        send_mail(
+            subject="Блокировка неактивных пользователей",
+            message=f"Заблокировано неактивных пользователей: {blocked}.",
+            from_email=EMAIL_HOST_USER,
+            recipient_list=recipient_list,
+            fail_silently=True,
+        )
+    except BadHeaderError:
+        logger.error("Отчет о блокировке пользователей не отправлен")
+    logger.info("Заблокировано пользователей: %s", blocked)
+    return blocked
 
 
 @shared_task
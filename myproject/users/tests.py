@@ -0,0 +1,1126 @@
+from django.contrib.auth.models import Group
+import hashlib
+import hmac
+import json
+import smtplib
+import time
+from datetime import timedelta
+from itertools import count
+from unittest import mock
+
+import stripe
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.celery import QUEUE_WORKERS, TASK_QUEUES, app as celery_app
+from edu_materials.models import Course, Lesson
+from .models import (
+    Payment,
+    StripeEvent,
+    StripePrice,
+    StripeProduct,
+    Subscription,
+    User,
+)
+from .last_login import flush_last_logins, get_last_login_buffer, record_last_login
+from .roles import get_user_roles, is_moderator
+from .tasks import blocking_users, send_course_update, send_course_update_batch
+
+
+class TestCase(APITestCase):
+    """Базовый тестовый класс для тестов приложения пользователей."""
+
+    def setUp(self):
+        """Задает начальные данные для тестов."""
+
+        cache.clear()
+        self.user = User.objects.create(email="user@sky.pro")
+        self.moderators = Group.objects.create(name="moderators")
+        self.client.force_authenticate(user=self.user)
+
+
+class StripeStub:
+    """Локальная заглушка Stripe API: выдает идентификаторы и запоминает вызовы."""
+
+    def __init__(self):
+        self.calls = []
+        self.ids = count(1)
+        self.patchers = [
+            mock.patch("stripe.Product.create", side_effect=self.stub("prod")),
+            mock.patch("stripe.Price.create", side_effect=self.stub("price")),
+            mock.patch("stripe.checkout.Session.create", side_effect=self.stub("cs")),
+        ]
+
+    def stub(self, prefix):
+        """Возвращает функцию, имитирующую создание объекта в Stripe."""
+
+        def create(**kwargs):
+            self.calls.append((prefix, kwargs))
+            object_id = f"{prefix}_{next(self.ids)}"
+            return {"id": object_id, "url": f"https://checkout.stripe.test/{object_id}"}
+
+        return create
+
+    def calls_of(self, prefix):
+        """Возвращает вызовы Stripe API указанного типа."""
+
+        return [kwargs for name, kwargs in self.calls if name == prefix]
+
+    def __enter__(self):
+        for patcher in self.patchers:
+            patcher.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patcher in self.patchers:
+            patcher.stop()
+
+
+class RolesTestCase(TestCase):
+    """Тесты вычисления ролей пользователя."""
+
+    def test_roles_resolved_once(self):
+        """Тест: группы пользователя запрашиваются из базы один раз."""
+
+        self.user.groups.add(self.moderators)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_moderator(self.user))
+            self.assertTrue(is_moderator(self.user))
+
+        fresh_user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_roles(fresh_user), frozenset({"moderators"}))
+
+    def test_roles_reset_on_groups_change(self):
+        """Тест: изменение групп пользователя сбрасывает кеш ролей."""
+
+        self.assertFalse(is_moderator(self.user))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.moderators)
+        self.assertTrue(is_moderator(User.objects.get(pk=self.user.pk)))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.moderators.user_set.clear()
+            self.assertTrue(is_moderator(User.objects.get(pk=self.user.pk)))
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(is_moderator(User.objects.get(pk=self.user.pk)))
+
+    def test_moderator_lesson_list_single_roles_query(self):
+        """Тест: при выводе списка уроков роли вычисляются один раз за запрос."""
+
+        self.user.groups.add(self.moderators)
+        course = Course.objects.create(name="Course", owner=self.user)
+        Lesson.objects.create(name="Lesson", course=course, owner=self.user)
+        cache.clear()
+
+        url = reverse("edu_materials:lesson_list")
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["count"], 1)
+
+
+class PaymentsListTestCase(TestCase):
+    """Тесты списка платежей."""
+
+    def test_payments_cursor_pagination(self):
+        """Тест: курсорная пагинация выдает платежи от новых к старым."""
+
+        for amount in range(1, 5):
+            Payment.objects.create(user=self.user, amount=amount)
+
+        url = reverse("users:payments")
+        response = self.client.get(url, {"pagination": "cursor", "page_size": 3})
+        data = response.json()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [payment["amount"] for payment in data["results"]],
+            ["4.00", "3.00", "2.00"],
+        )
+        self.assertIsNotNone(data["next"])
+
+    def test_payments_page_pagination_ordering(self):
+        """Тест: список платежей постраничный, от новых к старым,
+        сортировка по неиндексированному полю игнорируется."""
+
+        now = timezone.now()
+        for amount in range(1, 5):
+            Payment.objects.create(
+                user=self.user, amount=amount, payment_date=now - timedelta(days=amount)
+            )
+
+        url = reverse("users:payments")
+        response = self.client.get(url, {"ordering": "amount", "page_size": 3})
+        data = response.json()
+        self.assertEqual(data["count"], 4)
+        self.assertEqual(
+            [payment["amount"] for payment in data["results"]],
+            ["1.00", "2.00", "3.00"],
+        )
+        response = self.client.get(url, {"ordering": "payment_date", "page_size": 3})
+        self.assertEqual(
+            [payment["amount"] for payment in response.json()["results"]],
+            ["4.00", "3.00", "2.00"],
+        )
+
+
+class CourseUpdateTestCase(TestCase):
+    """Тесты рассылки об обновлении курса."""
+
+    @override_settings(COURSE_UPDATE_BATCH_SIZE=2)
+    def test_send_course_update_in_batches(self):
+        """Тест: письма отправляются пачками, каждому подписчику отдельно."""
+
+        course = Course.objects.create(name="Course", owner=self.user)
+        for number in range(5):
+            subscriber = User.objects.create(email=f"subscriber{number}@sky.pro")
+            Subscription.objects.create(owner=subscriber, course=course)
+
+        with self.assertNumQueries(2):
+            batches = send_course_update.delay(course.pk).get()
+
+        self.assertEqual(batches, 3)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [f"subscriber{number}@sky.pro" for number in range(5)],
+        )
+        self.assertIn('"Course"', mail.outbox[0].body)
+
+    def test_course_update_batch_retries_unsent(self):
+        """Тест: после ошибки SMTP пачка повторяется только для неотправленных
+        адресов, после исчерпания попыток задача завершается ошибкой."""
+
+        recipients = [f"subscriber{number}@sky.pro" for number in range(3)]
+        send_messages = locmem.EmailBackend.send_messages
+        failures = iter([False, True])
+
+        def fail_once(backend, messages):
+            if next(failures, False):
+                raise smtplib.SMTPServerDisconnected("disconnected")
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", fail_once):
+            send_course_update_batch.delay("Course", recipients)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), recipients)
+
+        with mock.patch.object(
+            locmem.EmailBackend,
+            "send_messages",
+            side_effect=smtplib.SMTPServerDisconnected("disconnected"),
+        ) as failing:
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                send_course_update_batch.delay("Course", recipients).get()
+        self.assertEqual(failing.call_count, 6)
+
+    def test_send_course_update_missing_course(self):
+        """Тест: для удаленного курса рассылка не выполняется."""
+
+        self.assertEqual(send_course_update.delay(0).get(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class BlockingUsersTestCase(TestCase):
+    """Тесты блокировки неактивных пользователей."""
+
+    def setUp(self):
+        """Создает пользователей с разной давностью входа."""
+
+        super().setUp()
+        now = timezone.now()
+        for number in range(3):
+            User.objects.create(
+                email=f"inactive{number}@sky.pro", last_login=now - timedelta(days=40)
+            )
+        User.objects.create(email="active@sky.pro", last_login=now - timedelta(days=1))
+        User.objects.create(email="never@sky.pro", last_login=None)
+
+    def test_dry_run_does_not_block(self):
+        """Тест: в режиме dry_run пользователи не блокируются."""
+
+        self.assertEqual(blocking_users(dry_run=True), 3)
+        self.assertEqual(User.objects.filter(is_active=False).count(), 0)
+
+    @override_settings(BLOCKING_USERS_CHUNK_SIZE=2)
+    def test_blocking_users_in_chunks(self):
+        """Тест: неактивные пользователи блокируются пачками UPDATE-запросов,
+        администратору отправляется итог без списка адресов."""
+
+        admin = User.objects.create(email="admin@sky.pro")
+        admin.groups.add(Group.objects.create(name="Администратор"))
+        self.assertEqual(blocking_users(), 3)
+        self.assertEqual(
+            sorted(
+                User.objects.filter(is_active=False).values_list("email", flat=True)
+            ),
+            [f"inactive{number}@sky.pro" for number in range(3)],
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("3", mail.outbox[0].body)
+        self.assertNotIn("inactive0@sky.pro", mail.outbox[0].body)
+        self.assertEqual(blocking_users(), 0)
+
+    def test_blocked_count_excludes_user_logged_in_after_selection(self):
+        """Тест: пользователь, вошедший после выборки пачки, не блокируется
+        и не попадает в итог."""
+
+        update = QuerySet.update
+
+        def login_then_update(queryset, **kwargs):
+            user = User.objects.get(email="inactive0@sky.pro")
+            user.last_login = timezone.now()
+            user.save(update_fields=["last_login"])
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", login_then_update):
+            self.assertEqual(blocking_users(), 2)
+        self.assertTrue(User.objects.get(email="inactive0@sky.pro").is_active)
+
+
+class PaymentCreateTestCase(TestCase):
+    """Тесты создания оплаты через Stripe."""
+
+    def setUp(self):
+        """Создает курс для оплаты."""
+
+        super().setUp()
+        self.course = Course.objects.create(name="Course", owner=self.user)
+        self.url = reverse("users:adding_payment")
+
+    def test_product_and_price_reused(self):
+        """Тест: продукт и цена создаются в Stripe один раз,
+        последующие оплаты делают только один запрос на создание сессии."""
+
+        with StripeStub() as stripe_stub:
+            for _ in range(3):
+                response = self.client.post(
+                    self.url, {"paid_course": self.course.pk, "amount": "150.00"}
+                )
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(len(stripe_stub.calls_of("prod")), 1)
+        self.assertEqual(len(stripe_stub.calls_of("price")), 1)
+        self.assertEqual(len(stripe_stub.calls_of("cs")), 3)
+        self.assertEqual(
+            stripe_stub.calls_of("prod")[0]["idempotency_key"],
+            f"product-course-{self.course.pk}",
+        )
+        self.assertEqual(stripe_stub.calls_of("price")[0]["unit_amount"], 15000)
+        self.assertEqual(StripeProduct.objects.get().course, self.course)
+        self.assertEqual(StripePrice.objects.count(), 1)
+        self.assertTrue(response.json()["payment_link"].startswith("https://"))
+
+    def test_new_amount_creates_new_price(self):
+        """Тест: новая сумма создает новую цену для того же продукта."""
+
+        with StripeStub() as stripe_stub:
+            for amount in ("150.00", "200.00"):
+                self.client.post(
+                    self.url, {"paid_course": self.course.pk, "amount": amount}
+                )
+
+        self.assertEqual(len(stripe_stub.calls_of("prod")), 1)
+        self.assertEqual(len(stripe_stub.calls_of("price")), 2)
+
+    def test_concurrent_product_mapping_reused(self):
+        """Тест: если продукт уже сохранен параллельной задачей,
+        используется сохраненный продукт, а транзакция остается рабочей."""
+
+        def create_concurrently(**kwargs):
+            StripeProduct.objects.create(course=self.course, product_id="prod_saved")
+            return {"id": "prod_other"}
+
+        with StripeStub() as stripe_stub, mock.patch(
+            "stripe.Product.create", side_effect=create_concurrently
+        ):
+            response = self.client.post(
+                self.url, {"paid_course": self.course.pk, "amount": "150.00"}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(stripe_stub.calls_of("price")[0]["product"], "prod_saved")
+        self.assertEqual(StripePrice.objects.get().product.product_id, "prod_saved")
+
+    def test_payment_requires_course_or_lesson(self):
+        """Тест: оплата без курса и урока не создается."""
+
+        with StripeStub() as stripe_stub:
+            response = self.client.post(self.url, {"amount": "150.00"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(stripe_stub.calls, [])
+
+    def test_async_checkout_returns_pending_payment(self):
+        """Тест: в асинхронном режиме платеж создается сразу,
+        сессия Stripe создается фоновой задачей, статус доступен по ссылке."""
+
+        with StripeStub() as stripe_stub, self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                f"{self.url}?async=true",
+                {"paid_course": self.course.pk, "amount": "150.00"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["status"], Payment.STATUS_PENDING)
+        self.assertEqual(stripe_stub.calls, [])
+
+        with StripeStub() as stripe_stub:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(
+            stripe_stub.calls_of("cs")[0]["idempotency_key"],
+            f"session-payment-{response.json()['id']}",
+        )
+
+        with self.assertNumQueries(1):
+            status_response = self.client.get(response.json()["status_url"])
+        self.assertEqual(status_response.json()["status"], Payment.STATUS_OPEN)
+        self.assertIsNotNone(status_response.json()["payment_link"])
+
+    def test_async_checkout_marks_failed_after_retries(self):
+        """Тест: после исчерпания попыток платеж получает статус ошибки."""
+
+        with mock.patch(
+            "stripe.Product.create", side_effect=stripe.APIConnectionError("down")
+        ) as product_create, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f"{self.url}?async=true",
+                {"paid_course": self.course.pk, "amount": "150.00"},
+            )
+
+        self.assertEqual(product_create.call_count, 6)
+        self.assertEqual(Payment.objects.get().status, Payment.STATUS_FAILED)
+
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+def signed_event(event_id, event_type, session):
+    """Формирует тело события Stripe и заголовок подписи для него."""
+
+    payload = json.dumps(
+        {
+            "id": event_id,
+            "object": "event",
+            "type": event_type,
+            "data": {"object": session},
+        }
+    )
+    timestamp = int(time.time())
+    signature = hmac.new(
+        WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+    ).hexdigest()
+    return payload, f"t={timestamp},v1={signature}"
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTestCase(TestCase):
+    """Тесты приема вебхуков Stripe."""
+
+    def setUp(self):
+        """Создает платежи с открытыми сессиями оплаты."""
+
+        super().setUp()
+        self.client.force_authenticate(user=None)
+        self.url = reverse("users:stripe_webhook")
+        self.payments = [
+            Payment.objects.create(
+                user=self.user,
+                amount=100,
+                session_id=f"cs_{number}",
+                status=Payment.STATUS_OPEN,
+            )
+            for number in range(3)
+        ]
+
+    def post_event(self, event_id, event_type, session):
+        """Отправляет подписанное событие на вебхук."""
+
+        payload, signature = signed_event(event_id, event_type, session)
+        return self.client.generic(
+            "POST",
+            self.url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+    def test_events_update_payments(self):
+        """Тест: события вебхука обновляют статусы платежей, дубликаты отбрасываются."""
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            for event_id in ("evt_1", "evt_1"):
+                response = self.post_event(
+                    event_id,
+                    "checkout.session.completed",
+                    {"id": "cs_0", "payment_status": "paid"},
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.post_event("evt_2", "checkout.session.expired", {"id": "cs_1"})
+            self.post_event("evt_3", "checkout.session.expired", {"id": "cs_0"})
+
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(StripeEvent.objects.count(), 3)
+        for callback in callbacks:
+            callback()
+
+        statuses = dict(Payment.objects.values_list("session_id", "status"))
+        self.assertEqual(
+            statuses,
+            {
+                "cs_0": Payment.STATUS_PAID,
+                "cs_1": Payment.STATUS_EXPIRED,
+                "cs_2": Payment.STATUS_OPEN,
+            },
+        )
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_invalid_signature_rejected(self):
+        """Тест: событие с неверной подписью не принимается."""
+
+        payload, _ = signed_event("evt_1", "checkout.session.completed", {"id": "cs_0"})
+        response = self.client.generic(
+            "POST",
+            self.url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE="t=1,v1=invalid",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+
+class SubscriptionTestCase(TestCase):
+    """Тесты подписки на курсы."""
+
+    def setUp(self):
+        """Создает курсы для подписки."""
+
+        super().setUp()
+        self.courses = [
+            Course.objects.create(name=f"Course {number}", owner=self.user)
+            for number in range(3)
+        ]
+        self.url = reverse("users:subscription")
+
+    def test_toggle_subscription(self):
+        """Тест: повторный запрос отменяет подписку, каждый запрос - не более двух
+        запросов к подпискам и одного обновления счетчика."""
+
+        course = self.courses[0]
+        with self.assertNumQueries(3):
+            response = self.client.post(self.url, {"course": course.pk})
+        self.assertEqual(response.json()["message"], "Подписка добавлена.")
+        self.assertTrue(
+            Subscription.objects.filter(owner=self.user, course=course).exists()
+        )
+
+        with self.assertNumQueries(2):
+            response = self.client.post(self.url, {"course": course.pk})
+        self.assertEqual(response.json()["message"], "Подписка удалена.")
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_toggle_missing_course(self):
+        """Тест: подписка на несуществующий курс возвращает 404."""
+
+        response = self.client.post(self.url, {"course": 0})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_course_id_out_of_range(self):
+        """Тест: идентификатор курса вне диапазона базы данных отклоняется
+        без ошибки сервера."""
+
+        response = self.client.post(self.url, {"course": 10**30})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(
+            reverse("users:subscription_bulk"),
+            {"subscribe": [10**30], "unsubscribe": [10**30 + 1]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {"subscribe", "unsubscribe"})
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_list_subscription_without_course(self):
+        """Тест: подписка на удаленный курс выводится в истории без ошибки."""
+
+        Subscription.objects.create(owner=self.user, course=self.courses[0])
+        Subscription.objects.create(owner=self.user, course=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()["results"]
+        self.assertEqual(
+            [(item["course"], item["course_updated"]) for item in results],
+            [(None, False), (self.courses[0].pk, False)],
+        )
+
+    def test_bulk_subscription(self):
+        """Тест: массовая подписка и отписка, уже существующие подписки не дублируются."""
+
+        Subscription.objects.create(owner=self.user, course=self.courses[0])
+        Subscription.objects.create(owner=self.user, course=self.courses[1])
+        response = self.client.post(
+            reverse("users:subscription_bulk"),
+            {
+                "subscribe": [self.courses[0].pk, self.courses[2].pk, 9999],
+                "unsubscribe": [self.courses[1].pk],
+            },
+            format="json",
+        )
+        self.assertEqual(
+            response.json(),
+            {"subscribed": [self.courses[2].pk], "unsubscribed": [self.courses[1].pk]},
+        )
+        self.assertEqual(
+            sorted(
+                Subscription.objects.filter(owner=self.user).values_list(
+                    "course", flat=True
+                )
+            ),
+            [self.courses[0].pk, self.courses[2].pk],
+        )
+        counters = Course.objects.order_by("pk").values_list(
+            "subscribers_count", flat=True
+        )
+        self.assertEqual(list(counters), [1, 0, 1])
+
+
+@override_settings(USER_HISTORY_LIMIT=3)
+class UserHistoryTestCase(TestCase):
+    """Тесты истории платежей и подписок в ответе редактирования пользователя."""
+
+    def setUp(self):
+        """Создает курсы, платежи и подписки пользователя."""
+
+        super().setUp()
+        self.url = reverse("users:update_user", args=[self.user.pk])
+        now = timezone.now()
+        self.courses = []
+        for number in range(5):
+            course = Course.objects.create(name=f"Course {number}")
+            self.courses.append(course)
+            Payment.objects.create(
+                user=self.user,
+                paid_course=course,
+                amount=100 + number,
+                payment_date=now - timedelta(days=number),
+            )
+            Subscription.objects.create(owner=self.user, course=course)
+
+    def test_history_is_bounded(self):
+        """Тест: в истории последние записи, признак продолжения и ссылка на полный список."""
+
+        response = self.client.patch(self.url, {"town": "Moscow"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payment_info = response.json()["payment_info"]
+        self.assertEqual(
+            [payment["paid_course"] for payment in payment_info["results"]],
+            [course.pk for course in self.courses[:3]],
+        )
+        self.assertTrue(payment_info["has_more"])
+        self.assertTrue(payment_info["url"].endswith(f"?user={self.user.pk}"))
+
+        subscriptions = response.json()["subscriptions"]
+        self.assertEqual(
+            [subscription["course_name"] for subscription in subscriptions["results"]],
+            ["Course 4", "Course 3", "Course 2"],
+        )
+        self.assertTrue(subscriptions["has_more"])
+        self.assertEqual(
+            self.client.get(subscriptions["url"]).json()["count"],
+            len(self.courses),
+        )
+
+    def test_history_queries_do_not_grow(self):
+        """Тест: число запросов не зависит от длины истории пользователя."""
+
+        other = User.objects.create(email="other@sky.pro")
+        self.client.force_authenticate(user=other)
+        with self.assertNumQueries(6):
+            self.client.patch(
+                reverse("users:update_user", args=[other.pk]), {"town": "Moscow"}
+            )
+
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(6):
+            self.client.patch(self.url, {"town": "Moscow"})
+
+
+@override_settings(USER_HISTORY_LIMIT=3)
+class UserDetailTestCase(TestCase):
+    """Тесты детализации и списка пользователей."""
+
+    def setUp(self):
+        """Создает платежи пользователя и других пользователей."""
+
+        super().setUp()
+        now = timezone.now()
+        for number in range(5):
+            course = Course.objects.create(name=f"Course {number}")
+            Payment.objects.create(
+                user=self.user,
+                paid_course=course,
+                paid_lesson=Lesson.objects.create(name=f"Lesson {number}"),
+                amount=100,
+                payment_date=now - timedelta(days=number),
+            )
+        for number in range(5):
+            User.objects.create(email=f"user{number}@sky.pro")
+
+    def test_owner_detail_has_recent_payments(self):
+        """Тест: владелец видит последние платежи, выбранные одним запросом."""
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("users:user_detail", args=[self.user.pk])
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payments = response.json()["payments"]
+        self.assertEqual(len(payments), 3)
+        self.assertEqual(
+            [payment["id"] for payment in payments],
+            list(
+                Payment.objects.order_by("-payment_date").values_list("id", flat=True)[
+                    :3
+                ]
+            ),
+        )
+
+    def test_other_user_detail(self):
+        """Тест: детализация чужого пользователя без платежей, одним запросом."""
+
+        other = User.objects.get(email="user0@sky.pro")
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("users:user_detail", args=[other.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("payments", response.json())
+
+    def test_user_list_paginated(self):
+        """Тест: список пользователей постраничный, два запроса на страницу."""
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("users:user_list"), {"page_size": 10})
+        self.assertEqual(response.json()["count"], 6)
+        self.assertEqual(len(response.json()["results"]), 6)
+        self.assertEqual(
+            set(response.json()["results"][0]),
+            {"id", "email", "phone", "town", "avatar"},
+        )
+
+
+class QueryPlanTestCase(TestCase):
+    """Тесты планов выполнения частых запросов: на заполненных данных
+    запросы контроллеров и задач должны использовать индексы."""
+
+    def setUp(self):
+        """Заполняет базу курсами, уроками, платежами и подписками."""
+
+        super().setUp()
+        users = User.objects.bulk_create(
+            User(email=f"user{number}@sky.pro", last_login=timezone.now())
+            for number in range(50)
+        )
+        courses = Course.objects.bulk_create(
+            Course(name=f"Course {number}", owner=users[number % len(users)])
+            for number in range(100)
+        )
+        Lesson.objects.bulk_create(
+            Lesson(
+                name=f"Lesson {number}",
+                course=courses[number % len(courses)],
+                owner=users[number % len(users)],
+            )
+            for number in range(500)
+        )
+        Payment.objects.bulk_create(
+            Payment(
+                user=users[number % len(users)],
+                paid_course=courses[number % len(courses)],
+                amount=100,
+                payment_type="CASH" if number % 2 else "BANK_TRANSFER",
+                session_id=f"cs_{number}" if number % 3 else None,
+            )
+            for number in range(1000)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(owner=user, course=course)
+            for user in users
+            for course in courses[:10]
+        )
+        self.owner = users[0]
+        self.course = courses[0]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index_name):
+        """Проверяет, что план выполнения запроса использует указанный индекс."""
+
+        if connection.vendor == "postgresql":
+            # на небольших таблицах PostgreSQL предпочитает полный просмотр
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index_name, queryset.explain())
+
+    def test_owner_materials_use_indexes(self):
+        """Тест: курсы и уроки владельца выбираются по индексам (owner, id)."""
+
+        self.assertUsesIndex(
+            Course.objects.filter(owner=self.owner).order_by("id"),
+            "course_owner_id_idx",
+        )
+        self.assertUsesIndex(
+            Lesson.objects.filter(owner=self.owner).order_by("id"),
+            "lesson_owner_id_idx",
+        )
+        self.assertUsesIndex(
+            Lesson.objects.filter(course=self.course).order_by("id"),
+            "lesson_course_id_idx",
+        )
+
+    def test_payments_use_indexes(self):
+        """Тест: история платежей, фильтр по курсу и способу оплаты
+        и поиск по сессиям Stripe используют индексы."""
+
+        self.assertUsesIndex(
+            Payment.objects.filter(user=self.owner).order_by("-payment_date", "-id"),
+            "payment_user_date_idx",
+        )
+        self.assertUsesIndex(
+            Payment.objects.filter(paid_course=self.course, payment_type="CASH"),
+            "payment_course_type_idx",
+        )
+        self.assertUsesIndex(
+            Payment.objects.filter(session_id__in=["cs_1", "cs_2"]),
+            "payment_session_id_idx",
+        )
+
+    def test_subscriptions_use_index(self):
+        """Тест: подписки пользователя выбираются по индексу (owner, created_at, id)."""
+
+        self.assertUsesIndex(
+            Subscription.objects.filter(owner=self.owner).order_by(
+                "-created_at", "-id"
+            ),
+            "subscription_owner_created_idx",
+        )
+
+    def test_inactive_users_use_index(self):
+        """Тест: выборка неактивных пользователей для блокировки использует индекс."""
+
+        self.assertUsesIndex(
+            User.objects.filter(is_active=True, last_login__lt=timezone.now()),
+            "user_active_last_login_idx",
+        )
+
+
+class PaymentExportTestCase(TestCase):
+    """Тесты потоковой выгрузки платежей."""
+
+    def setUp(self):
+        """Создает платежи за разные дни по двум курсам."""
+
+        super().setUp()
+        self.user.groups.add(self.moderators)
+        self.url = reverse("users:payments_export")
+        self.course = Course.objects.create(name="Course")
+        other_course = Course.objects.create(name="Other")
+        self.now = timezone.now()
+        for number in range(6):
+            Payment.objects.create(
+                user=self.user,
+                paid_course=self.course if number % 2 else other_course,
+                amount=100 + number,
+                payment_type="CASH",
+                payment_date=self.now - timedelta(days=number),
+            )
+
+    def test_export_csv(self):
+        """Тест: CSV-выгрузка потоковая, с заголовком и фильтром по курсу."""
+
+        response = self.client.get(self.url, {"paid_course": self.course.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0],
+            "id,user,payment_date,paid_course,paid_lesson,"
+            "amount,payment_type,status",
+        )
+        self.assertEqual(
+            [line.split(",")[5] for line in lines[1:]], ["101.00", "103.00", "105.00"]
+        )
+
+    def test_export_ndjson_date_range(self):
+        """Тест: NDJSON-выгрузка с фильтром по диапазону дат."""
+
+        response = self.client.get(
+            self.url,
+            {
+                "export_format": "ndjson",
+                "date_from": (self.now - timedelta(days=2, hours=1)).isoformat(),
+                "date_to": (self.now - timedelta(hours=1)).isoformat(),
+            },
+        )
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual([row["amount"] for row in rows], ["101.00", "102.00"])
+
+    def test_export_for_moderators_only(self):
+        """Тест: выгрузка платежей недоступна пользователю без роли модератора."""
+
+        other_user = User.objects.create(email="other@sky.pro")
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_unknown_format(self):
+        """Тест: неизвестный формат выгрузки отклоняется."""
+
+        response = self.client.get(self.url, {"export_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentReportTestCase(TestCase):
+    """Тесты отчета по платежам."""
+
+    def setUp(self):
+        """Создает платежи по двум курсам разными способами оплаты."""
+
+        super().setUp()
+        self.user.groups.add(self.moderators)
+        self.url = reverse("users:payments_report")
+        self.courses = [Course.objects.create(name=f"Course {n}") for n in range(2)]
+        now = timezone.now()
+        for number in range(6):
+            Payment.objects.create(
+                user=self.user,
+                paid_course=self.courses[number % 2],
+                amount=100,
+                payment_type="CASH" if number < 4 else "BANK_TRANSFER",
+                payment_date=now - timedelta(days=number // 2),
+            )
+
+    def test_report_by_course_and_type(self):
+        """Тест: итоги по курсу и способу оплаты считаются одним запросом."""
+
+        self.client.get(self.url)  # роли пользователя попадают в кеш
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, {"group_by": "paid_course,payment_type"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(
+                (row["paid_course"], row["payment_type"], row["total"], row["count"])
+                for row in response.json()
+            ),
+            [
+                (self.courses[0].pk, "BANK_TRANSFER", "100.00", 1),
+                (self.courses[0].pk, "CASH", "200.00", 2),
+                (self.courses[1].pk, "BANK_TRANSFER", "100.00", 1),
+                (self.courses[1].pk, "CASH", "200.00", 2),
+            ],
+        )
+
+    def test_report_by_day(self):
+        """Тест: итоги по дням."""
+
+        response = self.client.get(
+            self.url, {"group_by": "payment_type", "period": "day"}
+        )
+        self.assertEqual(
+            [(row["payment_type"], row["count"]) for row in response.json()],
+            [("BANK_TRANSFER", 2), ("CASH", 2), ("CASH", 2)],
+        )
+
+    def test_report_only_selected_groups(self):
+        """Тест: в строках отчета нет полей группировки, не указанных в запросе."""
+
+        response = self.client.get(self.url, {"group_by": "payment_type"})
+        for row in response.json():
+            self.assertEqual(set(row), {"payment_type", "total", "count"})
+
+    def test_report_cached_until_new_payment(self):
+        """Тест: отчет берется из кеша, пока не появится новый платеж."""
+
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(user=self.user, amount=50, payment_type="CASH")
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(
+            {row["payment_type"]: row["count"] for row in response.json()},
+            {"BANK_TRANSFER": 2, "CASH": 5},
+        )
+
+    def test_report_invalid_group(self):
+        """Тест: группировка по неизвестному полю отклоняется."""
+
+        response = self.client.get(self.url, {"group_by": "amount"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_report_for_moderators_only(self):
+        """Тест: отчет недоступен пользователю без роли модератора."""
+
+        self.user.groups.remove(self.moderators)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+    """Тесты аутентификации по JWT с кешированием пользователя."""
+
+    def setUp(self):
+        """Авторизует модератора по access-токену вместо принудительной авторизации."""
+
+        super().setUp()
+        self.user.groups.add(self.moderators)
+        self.client.force_authenticate(user=None)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        self.url = reverse("users:payments_report")
+
+    def test_user_and_roles_resolved_from_cache(self):
+        """Тест: после первого запроса пользователь и его роли берутся из кеша."""
+
+        with self.assertNumQueries(3):
+            self.client.get(self.url, {"group_by": "paid_course"})
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {"group_by": "payment_type"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_blocked_user_rejected(self):
+        """Тест: заблокированный пользователь не проходит аутентификацию
+        сразу после блокировки, несмотря на кеш."""
+
+        User.objects.filter(pk=self.user.pk).update(
+            last_login=timezone.now() - timedelta(days=60)
+        )
+        self.client.get(self.url)
+        blocking_users()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_save_resets_cache(self):
+        """Тест: изменение пользователя сбрасывает закешированный снимок
+        после фиксации транзакции."""
+
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.is_active = False
+            self.user.save()
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(callbacks), 1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class DictLastLoginBuffer:
+    """Буфер времени входа в словаре с интерфейсом RedisLastLoginBuffer для тестов."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def record(self, user_id, timestamp):
+        self.entries[user_id] = timestamp
+
+    def drain(self):
+        entries, self.entries = self.entries, {}
+        return entries
+
+
+class LastLoginBufferTestCase(TestCase):
+    """Тесты буферизованной записи времени входа."""
+
+    def setUp(self):
+        """Создает пользователя с паролем и подключает буфер входов."""
+
+        super().setUp()
+        self.user.set_password("password")
+        self.user.last_login = timezone.now() - timedelta(days=60)
+        self.user.save()
+        self.client.force_authenticate(user=None)
+        patcher = mock.patch("users.last_login._buffer", DictLastLoginBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self):
+        """Выполняет вход пользователя по почте и паролю."""
+
+        return self.client.post(
+            reverse("users:user_login"),
+            {"email": self.user.email, "password": "password"},
+        )
+
+    def test_login_buffers_last_login(self):
+        """Тест: вход не обновляет пользователя, время входа записывается
+        в базу одним UPDATE при выгрузке буфера."""
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [query for query in queries.captured_queries if "UPDATE" in query["sql"]]
+        )
+        other = User.objects.create(email="other@sky.pro", password="!")
+        record_last_login(other)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_last_logins(), 2)
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.last_login, timezone.now() - timedelta(minutes=1))
+
+    def test_blocking_users_sees_buffered_login(self):
+        """Тест: блокировка учитывает входы, еще не записанные в базу."""
+
+        self.login()
+        self.assertEqual(blocking_users(), 0)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+    def test_login_without_buffer_updates_user(self):
+        """Тест: без общего буфера Redis время входа сразу записывается в базу."""
+
+        with mock.patch("users.last_login._buffer", None):
+            self.login()
+            self.assertIsNone(get_last_login_buffer())
+            self.assertEqual(flush_last_logins(), 0)
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.last_login, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(blocking_users(), 0)
+
+
+class CeleryRoutingTestCase(APITestCase):
+    """Тесты маршрутизации задач Celery по очередям."""
+
+    def test_tasks_routed_to_own_queues(self):
+        """Тест: каждая очередь получает задачи только по своему ключу,
+        задачи с запросами к базе не попадают в очередь eventlet."""
+
+        router = celery_app.amqp.router
+        routing_keys = [queue.routing_key for queue in celery_app.conf.task_queues]
+        self.assertEqual(len(routing_keys), len(set(routing_keys)))
+        for name, queue in TASK_QUEUES.items():
+            for task in queue["tasks"]:
+                self.assertEqual(router.route({}, task)["queue"].routing_key, name)
+        self.assertNotIn(
+            "users.tasks.send_course_update", TASK_QUEUES["notifications"]["tasks"]
+        )
+        self.assertEqual(QUEUE_WORKERS["course_updates"]["pool"], "prefork")
@@ -10,11 +10,16 @@ from .views import (
     UserRetrieveAPIView,
     UserUpdateAPIView,
     PaymentsListAPIView,
+    PaymentExportAPIView,
+    PaymentReportAPIView,
     PaymentRetrieveAPIView,
     PaymentCreateAPIView,
+    PaymentStatusAPIView,
     PaymentUpdateAPIView,
     PaymentDestroyAPIView,
     SubscriptionView,
+    SubscriptionBulkView,
+    StripeWebhookAPIView,
 )
 
 app_name = UsersConfig.name
@@ -36,8 +41,15 @@ urlpatterns = [
     path("users/<int:pk>/update", UserUpdateAPIView.as_view(), name="update_user"),
     path("users/<int:pk>/delete", UserDestroyAPIView.as_view(), name="delete_user"),
     path("payments/", PaymentsListAPIView.as_view(), name="payments"),
+    path("payments/export/", PaymentExportAPIView.as_view(), name="payments_export"),
+    path("payments/report/", PaymentReportAPIView.as_view(), name="payments_report"),
     path("payment/<int:pk>/", PaymentRetrieveAPIView.as_view(), name="payment"),
     path("payment/pay/", PaymentCreateAPIView.as_view(), name="adding_payment"),
+    path(
+        "payment/<int:pk>/status/",
+        PaymentStatusAPIView.as_view(),
+        name="payment_status",
+    ),
     path(
         "payment/<int:pk>/adjust/",
         PaymentUpdateAPIView.as_view(),
@@ -49,4 +61,10 @@ urlpatterns = [
         name="delete_payment",
     ),
     path("subscription/", SubscriptionView.as_view(), name="subscription"),
+    path(
+        "subscription/bulk/",
+        SubscriptionBulkView.as_view(),
+        name="subscription_bulk",
+    ),
+    path("webhooks/stripe/", StripeWebhookAPIView.as_view(), name="stripe_webhook"),
 ]
@@ -1,23 +1,38 @@
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import generics
+from rest_framework import generics, status
 from rest_framework.filters import OrderingFilter
-from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
-from .models import Payment, User, Subscription
-from .permissions import IsUser, IsOwner, IsUserOwner
+from .exports import stream_csv, stream_ndjson
+from .filters import PaymentFilter
+from .models import MAX_COURSE_ID, Payment, StripeEvent, User, Subscription
+from .permissions import IsModerator, IsUser, IsOwner, IsUserOwner
 from .serializers import (
     PaymentSerializer,
+    PaymentReportSerializer,
+    PaymentStatusSerializer,
     UserBaseSerializer,
     UserSerializer,
-    SubscriptionSerializer,
+    SubscriptionBulkSerializer,
+    SubscriptionHistorySerializer,
     CustomUserSerializer,
 )
-from .services import create_product, create_price, create_session
+from .services import create_checkout
+from .tasks import create_checkout_session, process_stripe_events
+from edu_materials.caching import CachedResponseMixin
 from edu_materials.models import Course
+from edu_materials.paginators import KeysetPaginationMixin, LMSPagination
 
 
 class UserCreateAPIView(generics.CreateAPIView):
@@ -40,12 +55,31 @@ class UserUpdateAPIView(generics.UpdateAPIView):
     serializer_class = CustomUserSerializer
     permission_classes = [IsAuthenticated & IsUserOwner]
 
+    def get_queryset(self):
+        """Метод предзагружает ограниченную историю платежей и подписок пользователя."""
+        return (
+            super()
+            .get_queryset()
+            .prefetch_related(*CustomUserSerializer.history_prefetches())
+        )
+
 
 class UserRetrieveAPIView(generics.RetrieveAPIView):
     """Контроллер, позволяет получать детализацию о пользователе"""
 
     queryset = User.objects.all()
 
+    def get_queryset(self):
+        """Метод предзагружает последние платежи для полной детализации
+        и ограничивает выборку полями частичной детализации."""
+        if self.get_serializer_class() is UserSerializer:
+            return (
+                super()
+                .get_queryset()
+                .prefetch_related(UserSerializer.payments_prefetch())
+            )
+        return super().get_queryset().only(*UserBaseSerializer.Meta.fields)
+
     def get_serializer_class(self):
         """Метод, позволяет получать детализацию полную для пользователя,
         и частичную не для этого пользователя"""
@@ -57,8 +91,9 @@ class UserRetrieveAPIView(generics.RetrieveAPIView):
 class UserListAPIView(generics.ListAPIView):
     """Контроллер, позволяет получать список пользователей"""
 
-    queryset = User.objects.all()
+    queryset = User.objects.only(*UserBaseSerializer.Meta.fields).order_by("id")
     serializer_class = UserBaseSerializer
+    pagination_class = LMSPagination
 
 
 class UserDestroyAPIView(generics.DestroyAPIView):
@@ -68,17 +103,142 @@ class UserDestroyAPIView(generics.DestroyAPIView):
     permission_classes = (IsUser,)
 
 
-class PaymentsListAPIView(generics.ListAPIView):
-    """Контроллер для списка оплат."""
+class PaymentsListAPIView(KeysetPaginationMixin, generics.ListAPIView):
+    """Контроллер для списка оплат с постраничным выводом.
+    Курсорный постраничный вывод включается параметром ?pagination=cursor."""
 
     serializer_class = PaymentSerializer
     queryset = Payment.objects.all()
+    pagination_class = LMSPagination
+    cursor_ordering = ("-payment_date", "-id")
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ("paid_course", "paid_lesson", "payment_type")
-    ordering_fields = ("payment_date",)
+    filterset_class = PaymentFilter
+    # сортировка только по полям индексов payment_date_id_idx и первичного ключа
+    ordering_fields = ("payment_date", "id")
+    ordering = ("-payment_date", "-id")
     permission_classes = [IsAuthenticated]
 
 
+class PaymentExportAPIView(generics.GenericAPIView):
+    """Контроллер потоковой выгрузки платежей в CSV или NDJSON для отчетности модераторов.
+    Формат выбирается параметром ?export_format=csv|ndjson, фильтры совпадают
+    со списком платежей. Платежи читаются из базы частями по
+    PAYMENTS_EXPORT_CHUNK_SIZE строк, поэтому память не зависит от объема выгрузки."""
+
+    queryset = Payment.objects.all()
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = PaymentFilter
+    permission_classes = [IsAuthenticated & IsModerator]
+    export_fields = (
+        "id",
+        "user",
+        "payment_date",
+        "paid_course",
+        "paid_lesson",
+        "amount",
+        "payment_type",
+        "status",
+    )
+    content_types = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "export_format",
+                openapi.IN_QUERY,
+                type=openapi.TYPE_STRING,
+                enum=["csv", "ndjson"],
+                default="csv",
+            )
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        """Метод возвращает потоковый ответ с выгрузкой платежей."""
+
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in self.content_types:
+            raise ValidationError(
+                {"export_format": "Поддерживаются форматы: csv, ndjson."}
+            )
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .order_by("-payment_date", "-id")
+            .values_list(*self.export_fields)
+            .iterator(chunk_size=settings.PAYMENTS_EXPORT_CHUNK_SIZE)
+        )
+        render = stream_csv if export_format == "csv" else stream_ndjson
+        response = StreamingHttpResponse(
+            render(self.export_fields, rows),
+            content_type=self.content_types[export_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="payments.{export_format}"'
+        )
+        return response
+
+
+class PaymentReportAPIView(CachedResponseMixin, generics.GenericAPIView):
+    """Контроллер отчета по платежам для модераторов: сумма и количество платежей
+    по группам paid_course, paid_lesson, payment_type (?group_by=, через запятую)
+    и, при необходимости, по дням или месяцам (?period=day|month).
+    Отчет считается одним SQL-запросом с GROUP BY, фильтры совпадают со списком
+    платежей. Ответ кешируется на PAYMENTS_REPORT_CACHE_TIMEOUT секунд
+    и сбрасывается при изменении платежей."""
+
+    queryset = Payment.objects.all()
+    serializer_class = PaymentReportSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = PaymentFilter
+    permission_classes = [IsAuthenticated & IsModerator]
+    group_fields = ("paid_course", "paid_lesson", "payment_type")
+    periods = {"day": TruncDay, "month": TruncMonth}
+
+    def get_cache_generations(self):
+        """Метод возвращает версию данных платежей для кеширования отчета."""
+        return ["payments"]
+
+    def get_cache_timeout(self):
+        """Метод возвращает время хранения отчета в кеше, секунды."""
+        return settings.PAYMENTS_REPORT_CACHE_TIMEOUT
+
+    def get_report_params(self):
+        """Метод проверяет параметры группировки отчета."""
+        params = self.request.query_params
+        group_by = [
+            field
+            for field in params.get("group_by", "payment_type").split(",")
+            if field
+        ]
+        if not group_by or set(group_by) - set(self.group_fields):
+            raise ValidationError(
+                {"group_by": f"Допустимые поля: {', '.join(self.group_fields)}."}
+            )
+        period = params.get("period")
+        if period is not None and period not in self.periods:
+            raise ValidationError({"period": "Допустимые значения: day, month."})
+        return list(dict.fromkeys(group_by)), period
+
+    def get(self, request, *args, **kwargs):
+        """Метод возвращает отчет по платежам из кеша или считает его в базе."""
+        return self.cached_response(self.report, request, *args, **kwargs)
+
+    def report(self, request, *args, **kwargs):
+        """Метод считает итоги по группам платежей одним запросом."""
+        group_by, period = self.get_report_params()
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        if period:
+            queryset = queryset.annotate(period=self.periods[period]("payment_date"))
+            group_by.append("period")
+        rows = (
+            queryset.values(*group_by)
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by(*group_by)
+        )
+        context = {**self.get_serializer_context(), "group_by": group_by}
+        serializer = self.get_serializer(rows, many=True, context=context)
+        return Response(serializer.data)
+
+
 class PaymentRetrieveAPIView(generics.RetrieveAPIView):
     """Контроллер для просмотра информации об оплате."""
 
@@ -88,20 +248,86 @@ class PaymentRetrieveAPIView(generics.RetrieveAPIView):
 
 
 class PaymentCreateAPIView(generics.CreateAPIView):
-    """Контроллер для создания оплаты через платежный сервис Stripe"""
+    """Контроллер для создания оплаты через платежный сервис Stripe.
+    В асинхронном режиме (PAYMENT_CHECKOUT_ASYNC или ?async=true) платеж создается
+    со статусом "pending", а сессия Stripe создается фоновой задачей."""
 
     serializer_class = PaymentSerializer
 
+    def is_async_checkout(self):
+        """Метод определяет, создавать ли сессию оплаты в фоне."""
+        value = self.request.query_params.get("async")
+        if value is None:
+            return settings.PAYMENT_CHECKOUT_ASYNC
+        return value.lower() in ("1", "true", "yes")
+
+    def create(self, request, *args, **kwargs):
+        """Метод создания платежа, в асинхронном режиме возвращает 202 и ссылку на статус."""
+        response = super().create(request, *args, **kwargs)
+        if self.is_async_checkout():
+            response.status_code = status.HTTP_202_ACCEPTED
+            response.data["status_url"] = reverse(
+                "users:payment_status", args=[response.data["id"]], request=request
+            )
+        return response
+
     def perform_create(self, serializer):
         """Метод вносит изменение в сериализатор создания платежа"""
 
-        payment = serializer.save(user=self.request.user)
-        product_id = create_product(payment)
-        price = create_price(payment, product_id)
-        session_id, session_url = create_session(price)
-        payment.session_id = session_id
-        payment.payment_link = session_url
-        payment.save()
+        validated_data = serializer.validated_data
+        if not (validated_data.get("paid_course") or validated_data.get("paid_lesson")):
+            raise ValidationError("Укажите оплачиваемый курс или урок.")
+        payment = serializer.save(user=self.request.user, status=Payment.STATUS_PENDING)
+        if self.is_async_checkout():
+            transaction.on_commit(lambda: create_checkout_session.delay(payment.pk))
+        else:
+            create_checkout(payment)
+
+
+class PaymentStatusAPIView(generics.RetrieveAPIView):
+    """Контроллер для проверки статуса оплаты владельцем платежа без обращения к Stripe."""
+
+    serializer_class = PaymentStatusSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Метод возвращает платежи текущего пользователя с минимальным набором полей."""
+        return Payment.objects.filter(user=self.request.user).only(
+            "id", "status", "payment_link"
+        )
+
+
+class StripeWebhookAPIView(APIView):
+    """Контроллер приема вебхуков Stripe.
+    Проверяет подпись, сохраняет событие один раз по его ID
+    и ставит обработку накопленных событий в очередь Celery."""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(auto_schema=None)
+    def post(self, request, *args, **kwargs):
+        """Метод приема события Stripe."""
+
+        try:
+            event = stripe.Webhook.construct_event(
+                request.body,
+                request.META.get("HTTP_STRIPE_SIGNATURE", ""),
+                settings.STRIPE_WEBHOOK_SECRET,
+            )
+        except (ValueError, stripe.SignatureVerificationError):
+            return Response(
+                {"detail": "Некорректная подпись события."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        _, created = StripeEvent.objects.get_or_create(
+            event_id=event["id"],
+            defaults={"type": event["type"], "payload": event["data"]["object"]},
+        )
+        if created:
+            transaction.on_commit(process_stripe_events.delay)
+        return Response({"received": True})
 
 
 class PaymentUpdateAPIView(generics.UpdateAPIView):
@@ -119,13 +345,25 @@ class PaymentDestroyAPIView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated & IsOwner]
 
 
-class SubscriptionView(APIView):
-    """Контроллер для создания или удаления подписки пользователя на курс."""
+class SubscriptionView(generics.ListAPIView):
+    """Контроллер для просмотра подписок пользователя (полная история подписок)
+    и для создания или удаления подписки пользователя на курс."""
 
     queryset = Subscription.objects.all()
-    serializer_class = SubscriptionSerializer
+    serializer_class = SubscriptionHistorySerializer
+    pagination_class = LMSPagination
     permission_classes = [IsAuthenticated | IsAuthenticated & IsOwner]
 
+    def get_queryset(self):
+        """Метод возвращает подписки текущего пользователя, начиная с последних."""
+        return (
+            super()
+            .get_queryset()
+            .filter(owner=self.request.user)
+            .select_related("course")
+            .order_by("-created_at", "-id")
+        )
+
     @swagger_auto_schema(
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -138,17 +376,44 @@ class SubscriptionView(APIView):
         удаление подписки пользователя на курс."""
 
         user = self.request.user
-        course_id = self.request.data.get("course")
-        course_item = get_object_or_404(Course, pk=course_id)
-
-        subscription_item = Subscription.objects.all().filter(
-            owner=user, course=course_item
-        )
-
-        if subscription_item.exists():
-            subscription_item.delete()
+        try:
+            course_id = int(self.request.data.get("course"))
+        except (TypeError, ValueError):
+            raise NotFound("Курс не найден.")
+        if not 1 <= course_id <= MAX_COURSE_ID:
+            raise NotFound("Курс не найден.")
+
+        if Subscription.objects.unsubscribe(user.pk, [course_id]):
             message = "Подписка удалена."
-        else:
-            Subscription.objects.create(owner=user, course=course_item)
+        elif Subscription.objects.subscribe(user.pk, [course_id]):
+            message = "Подписка добавлена."
+        elif Course.objects.filter(pk=course_id).exists():
+            # подписка уже добавлена параллельным запросом
             message = "Подписка добавлена."
+        else:
+            raise NotFound("Курс не найден.")
         return Response({"message": message})
+
+
+class SubscriptionBulkView(APIView):
+    """Контроллер для массовой подписки и отписки пользователя от курсов."""
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(request_body=SubscriptionBulkSerializer)
+    def post(self, request, *args, **kwargs):
+        """Метод подписывает пользователя на курсы из списка "subscribe"
+        и отписывает от курсов из списка "unsubscribe"."""
+
+        serializer = SubscriptionBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        unsubscribed = Subscription.objects.unsubscribe(
+            user.pk, serializer.validated_data["unsubscribe"]
+        )
+        subscribed = Subscription.objects.subscribe(
+            user.pk, serializer.validated_data["subscribe"]
+        )
+        return Response(
+            {"subscribed": sorted(subscribed), "unsubscribed": sorted(unsubscribed)}
+        )